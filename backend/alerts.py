@@ -0,0 +1,204 @@
+"""
+Price alerts. Rules live in the alert_rules table together with their running state
+(last, lowest and highest price seen, and whether the rule is currently triggered).
+evaluate_alerts() runs inside the price writer's transaction over each batch of new
+price points, so evaluating a point never reads price_history, however long it is.
+Fired alerts are recorded in alert_events and handed to an AlertNotifier, which
+delivers them in batches to pluggable sinks.
+"""
+import json
+import logging
+import threading
+
+from metrics import ALERT_DELIVERY_ERRORS, ALERTS_FIRED
+from pricing import format_price, format_timestamp
+
+# kind -> the rule column holding its threshold
+ALERT_KINDS = {
+    'target_price': 'target_minor', # fires when the price is at or below target_minor
+    'percent_drop': 'percent',      # fires when the price is `percent` % or more below the highest price seen
+}
+
+ALERT_BATCH_SIZE = 100
+ALERT_FLUSH_INTERVAL = 1.0
+
+
+def threshold_minor(rule):
+    """Price (minor units) at or below which a rule's condition holds, or None if it can't be known yet."""
+    if rule['kind'] == 'target_price':
+        return rule['target_minor']
+    if rule['max_price'] is None:
+        return None
+    return int(rule['max_price'] * (100 - rule['percent']) / 100)
+
+
+def evaluate_alerts(conn, rules, points_by_product, product_urls):
+    """
+    Runs `rules`, the enabled alert_rules rows (as dicts) of the products in a batch, over its
+    points in time order. `points_by_product` maps product_id to time-sorted (product_id, price_minor,
+    currency, timestamp) points, `product_urls` product_id to URL. Rules are edge-triggered: a rule
+    fires once when its condition becomes true and re-arms when it is false again. Stores the new
+    rule state, records fired alerts in alert_events and returns them as dicts.
+    """
+    if not rules:
+        return []
+
+    events = []
+    for rule in rules:
+        for _, price_minor, currency, timestamp in points_by_product[rule['product_id']]:
+            if rule['currency'] and currency and currency != rule['currency']:
+                continue
+            if rule['last_seen'] is not None and timestamp < rule['last_seen']:
+                continue # older than the state already holds
+            rule['last_price'] = price_minor
+            rule['last_seen'] = timestamp
+            rule['min_price'] = price_minor if rule['min_price'] is None else min(rule['min_price'], price_minor)
+            rule['max_price'] = price_minor if rule['max_price'] is None else max(rule['max_price'], price_minor)
+            threshold = threshold_minor(rule)
+            if threshold is not None and price_minor <= threshold:
+                if not rule['triggered']:
+                    rule['triggered'] = 1
+                    rule['triggered_at'] = timestamp
+                    events.append(_alert_event(rule, product_urls[rule['product_id']], price_minor,
+                                               currency or rule['currency'], threshold, timestamp))
+            else:
+                rule['triggered'] = 0
+
+    conn.executemany('''
+        UPDATE alert_rules SET
+        last_price = :last_price,
+        last_seen = :last_seen,
+        min_price = :min_price,
+        max_price = :max_price,
+        triggered = :triggered,
+        triggered_at = :triggered_at
+        WHERE id = :id
+    ''', rules)
+    conn.executemany('''
+        INSERT INTO alert_events (rule_id, product_id, price_minor, currency, threshold_minor, timestamp)
+        VALUES (:rule_id, :product_id, :price_minor, :currency, :threshold_minor, :timestamp)
+    ''', events)
+    return events
+
+
+def _alert_event(rule, url, price_minor, currency, threshold, timestamp):
+    ALERTS_FIRED.inc(rule['kind'])
+    price = format_price(price_minor, currency)
+    if rule['kind'] == 'target_price':
+        message = f"Price of {url} fell to {price} {currency or ''}, at or below the target of {format_price(threshold, currency)}"
+    else:
+        message = (f"Price of {url} fell to {price} {currency or ''}, {rule['percent']:g}% or more below "
+                   f"its high of {format_price(rule['max_price'], currency)}")
+    return {
+        'rule_id': rule['id'],
+        'product_id': rule['product_id'],
+        'url': url,
+        'kind': rule['kind'],
+        'price_minor': price_minor,
+        'currency': currency,
+        'threshold_minor': threshold,
+        'timestamp': timestamp,
+        'message': ' '.join(message.split()),
+    }
+
+
+class LogSink:
+    """Writes each alert to the application log."""
+    name = 'log'
+
+    def send(self, events):
+        for event in events:
+            logging.info(f"Price alert: {event['message']}")
+
+
+class JsonLinesSink:
+    """Appends each alert as one JSON object per line to a local file, e.g. for tests or a log shipper."""
+    name = 'jsonl'
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, events):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for event in events:
+                f.write(json.dumps(dict(event, timestamp=format_timestamp(event['timestamp']))) + '\n')
+
+
+class AlertNotifier:
+    """
+    Batched delivery queue for fired alerts. enqueue() only appends; a background thread
+    hands pending alerts to every sink in batches of up to `batch_size`, at most
+    `flush_interval` seconds after they were queued. A sink is any object with a
+    send(events) method (and optionally a `name` for metrics); a failing sink does
+    not keep the others from receiving the batch. Delivery is at most once.
+    """
+
+    def __init__(self, sinks=(), batch_size=ALERT_BATCH_SIZE, flush_interval=ALERT_FLUSH_INTERVAL):
+        self.sinks = list(sinks)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def enqueue(self, events):
+        if not events:
+            return
+        with self._condition:
+            self._pending.extend(events)
+            stopped = self._stopped
+            if not stopped:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='alert-notifier', daemon=True)
+                    self._thread.start()
+                self._condition.notify()
+        if stopped:
+            self.flush() # alerts from the final price flush at exit are delivered right away
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                if len(self._pending) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Delivers all pending alerts now."""
+        with self._flush_lock:
+            with self._condition:
+                pending, self._pending = self._pending, []
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                for sink in self.sinks:
+                    try:
+                        sink.send(batch)
+                    except Exception as e:
+                        ALERT_DELIVERY_ERRORS.inc(getattr(sink, 'name', type(sink).__name__))
+                        logging.error(f"Error delivering {len(batch)} alerts to {type(sink).__name__}: {e}")
+
+    def close(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+def build_notifier(log=True, jsonl_path=None, batch_size=ALERT_BATCH_SIZE, flush_interval=ALERT_FLUSH_INTERVAL):
+    """AlertNotifier with the built-in sinks enabled by configuration."""
+    sinks = []
+    if log:
+        sinks.append(LogSink())
+    if jsonl_path:
+        sinks.append(JsonLinesSink(jsonl_path))
+    return AlertNotifier(sinks, batch_size, flush_interval)
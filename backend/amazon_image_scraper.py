@@ -1,11 +1,7 @@
-from bs4 import BeautifulSoup
-import requests
+from product_extractor import get_page, parse_product_page
 
+# Kept for callers of the original scraper API; product_extractor.fetch_product returns the image
+# together with the rest of the product data from a single request.
 def get_amazon_image(url, headers):
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.content, "html.parser")
-    img_tag = soup.find("img", id="landingImage")
-    if img_tag:
-        return img_tag["src"]
-    return None
-
+    response = get_page(url, headers)
+    return parse_product_page(response.content, response.headers.get('Content-Type')).image_url
@@ -1,17 +1,42 @@
-from flask import Flask, request, render_template, jsonify # Added jsonify
+from flask import Flask, Response, g, request, render_template, jsonify, url_for # Added jsonify
 from flask_apscheduler import APScheduler # Added APScheduler
-from amazon_scraper import fetch_amazon_data
-from amazon_image_scraper import get_amazon_image
+from product_extractor import fetch_product
+from scrape_engine import ScrapeEngine
+from scrape_scheduler import AdaptiveScheduler
+from downsample import lttb
+from rollups import ROLLUP_BUCKETS
+from response_cache import ResponseCache
+from fetch_cache import FetchCache
+from sweep import SCHEDULE_OUTCOMES, run_sweep
+from bulk_ingest import BulkIngestor
+from product_keys import canonical_url, product_key
+from pricing import currency_for_url, format_timestamp, parse_price
+from alerts import ALERT_KINDS, build_notifier
+import metrics
+import settings
 # Updated database import
 from database import (
     init_db,
     add_or_update_tracked_product,
     save_price_history,
-    get_all_tracked_product_urls,
-    get_product_price_history,
-    get_tracked_product_details # Added
+    flush_price_history,
+    get_product_price_points,
+    get_product_price_rollup,
+    format_price_points,
+    add_write_listener,
+    get_tracked_product_details, # Added
+    get_tracked_urls_by_key,
+    get_product_schedule_stats,
+    get_ingest_job,
+    add_alert_listener,
+    create_alert_rule,
+    get_alert_rules,
+    get_latest_price
 )
+import atexit
 import logging # For better logging
+import time
+from datetime import datetime, timezone
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -22,48 +47,115 @@ app = Flask(__name__)
 class Config:
     SCHEDULER_API_ENABLED = True
 
+app.config.from_object(settings) # Scraping, caching, bulk tracking and alert settings (see settings.py)
 app.config.from_object(Config())
+scrape_engine = ScrapeEngine(
+    max_workers=app.config['SCRAPE_MAX_WORKERS'],
+    per_host_limit=app.config['SCRAPE_PER_HOST_LIMIT'],
+    min_delay=app.config['SCRAPE_MIN_DELAY'],
+    jitter=app.config['SCRAPE_JITTER']
+)
+fetch_cache = FetchCache()
+scrape_scheduler = AdaptiveScheduler(
+    min_interval=app.config['SCRAPE_MIN_INTERVAL'],
+    max_interval=app.config['SCRAPE_MAX_INTERVAL']
+)
+history_cache = ResponseCache(
+    max_entries=app.config['HISTORY_CACHE_SIZE'],
+    ttl=app.config['HISTORY_CACHE_TTL']
+)
+add_write_listener(history_cache.invalidate) # Any write to a product drops its cached history
+alert_notifier = build_notifier(
+    log=app.config['ALERT_LOG_ENABLED'],
+    jsonl_path=app.config['ALERT_JSONL_PATH'],
+    flush_interval=app.config['ALERT_FLUSH_INTERVAL']
+)
+add_alert_listener(alert_notifier.enqueue) # Alerts fired while writing price points are delivered in batches
+atexit.register(alert_notifier.close)
 scheduler = APScheduler()
 scheduler.init_app(app)
-scheduler.start()
+if app.config['SCRAPE_SCHEDULER_ENABLED']:
+    scheduler.start()
 # --- End APScheduler Configuration ---
 
 init_db() # Initialize DB schema if it doesn't exist
+if app.config['SCRAPE_SCHEDULER_ENABLED']:
+    scrape_scheduler.load(get_product_schedule_stats()) # Queue every tracked product by its next due time
 
 
 
 # --- Scheduled Job ---
+def record_scrape_outcome(url, outcome, product):
+    """run_sweep() callback: re-queues a scraped product in scrape_scheduler."""
+    scrape_scheduler.record(url, SCHEDULE_OUTCOMES[outcome], product.price_minor if product else None)
+
+bulk_ingestor = BulkIngestor(
+    scrape_engine,
+    fetch_cache,
+    on_result=record_scrape_outcome, # Queue bulk-added products for their next scrape
+    chunk_size=app.config['BULK_TRACK_CHUNK_SIZE'],
+    slowest=app.config['SWEEP_SLOWEST_URLS'],
+    # With worker.py processes the web process only queues bulk-added products as due scrape jobs
+    scrape=app.config['SCRAPE_SCHEDULER_ENABLED'],
+    job_interval=round(scrape_scheduler.initial_interval)
+)
+
 def scheduled_scrape_task():
     """
-    Fetches all tracked product URLs and scrapes data for each.
-    This function is run by the APScheduler.
+    Scrapes the tracked products that are due according to the adaptive scheduler,
+    concurrently through the scrape engine, and re-queues each one by its outcome.
+    Pages the fetch cache reports as unchanged are not parsed or written to price_history.
+    Returns the sweep summary (see metrics.SweepStats), or None if nothing was due.
+    If the sweep fails, products it left without an outcome are re-queued as failures.
+    This function is run by the APScheduler every few seconds, unless scraping is
+    left to worker.py processes (SCRAPE_SCHEDULER_ENABLED=0).
     """
     with app.app_context(): # Important for scheduler tasks needing app context
-        logging.info("Starting scheduled scrape task...")
-        urls_to_scrape = get_all_tracked_product_urls()
+        urls_to_scrape = scrape_scheduler.pop_due()
         if not urls_to_scrape:
-            logging.info("No products to track. Scheduled task finished.")
-            return
-
-        for url in urls_to_scrape:
-            logging.info(f"Scheduled scraping for: {url}")
-            product_data = fetch_amazon_data(url)
-            if product_data and product_data['price'] != "Price not found":
-                save_price_history(url, product_data['price'], product_data['timestamp'])
-                # Optionally update the title/image in tracked_products if they change
-                # For now, we only update them when user manually adds/tracks via UI
-                # add_or_update_tracked_product(url, product_data['title'], get_amazon_image(url, HEADERS)) # If you want to auto-update image too
-                logging.info(f"Successfully scraped and saved price for: {product_data['title']}")
-            elif product_data:
-                logging.warning(f"Price not found for {url}. Title: {product_data['title']}")
-            else:
-                logging.warning(f"Failed to fetch data for: {url}")
-        logging.info("Scheduled scrape task finished.")
+            return None
+        recorded = set()
+
+        def record_outcome(url, outcome, product):
+            recorded.add(url)
+            record_scrape_outcome(url, outcome, product)
+
+        try:
+            return run_sweep(urls_to_scrape, scrape_engine, fetch_cache, record_outcome,
+                             slowest=app.config['SWEEP_SLOWEST_URLS'])
+        except Exception:
+            # Popped products are in flight and would otherwise never be due again
+            for url in urls_to_scrape:
+                if url not in recorded:
+                    scrape_scheduler.record_failure(url)
+            logging.error(f"Scrape sweep failed; re-queued {len(urls_to_scrape) - len(recorded)} products.")
+            raise
 
 # Register the job with APScheduler
-# Runs every 1 hour. For testing, you can use minutes=1 or seconds=30
+# The job only ticks; how often each product is actually scraped is decided by scrape_scheduler
 if not scheduler.get_job('periodic_scrape_job'): # Avoid adding duplicate jobs on reload with debug=True
-    scheduler.add_job(id='periodic_scrape_job', func=scheduled_scrape_task, trigger='interval', minutes=5)
+    scheduler.add_job(id='periodic_scrape_job', func=scheduled_scrape_task, trigger='interval',
+                      seconds=app.config['SCRAPE_TICK_SECONDS'])
+
+
+# --- Request Metrics ---
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.endpoint or 'unmatched' # Not the raw path, which would make one series per product URL
+        metrics.API_SECONDS.observe(time.perf_counter() - started, endpoint)
+        metrics.API_REQUESTS.inc(endpoint, response.status_code)
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Pipeline and request metrics in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 # --- Flask Routes ---
@@ -81,36 +173,41 @@ def home():
                            message_type=None, # Added message_type for consistency
                            submitted_url="") # Pass empty submitted_url
 
+def tracked_url(url):
+    """URL the product behind `url` is tracked under (matched by product key), or None."""
+    key = product_key(url)
+    return get_tracked_urls_by_key([key]).get(key) if key else None
+
 @app.route('/track', methods=['POST'])
 def track():
     url = request.form['url']
+    # Track each product once, whatever tracking or query strings its URL carries
+    url = tracked_url(url) or canonical_url(url) or url
     message = None
     message_type = None
     product_display_info = { "name": "Product Not Found", "price": "N/A", "image_url": None }
 
-    ua_string = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0 Safari/537.36" # Example
-    HEADERS_FOR_IMAGE = {
-        "User-Agent": ua_string, # Make sure you have a User-Agent here
-        "Accept-Language": "en-US,en;q=0.9"
-    }
-
-    scraped_data = fetch_amazon_data(url)
+    # One request and one parse gives title, price, image, currency and availability
+    product = fetch_product(url)
 
-    if scraped_data:
-        image_url = get_amazon_image(url, HEADERS_FOR_IMAGE)
+    if product:
         product_display_info = {
-            "name": scraped_data['title'],
-            "price": scraped_data['price'],
-            "image_url": image_url
+            "name": product.title or "Title not found",
+            "price": product.price or "Price not found",
+            "image_url": product.image_url
         }
 
-        product_id = add_or_update_tracked_product(url, scraped_data['title'], image_url)
+        product_id = add_or_update_tracked_product(url, product.title, product.image_url)
         if product_id:
-            if scraped_data['price'] != "Price not found" and scraped_data['price'] is not None: # Check for None too
-                save_price_history(url, scraped_data['price'], scraped_data['timestamp'])
-            message = f"Product '{scraped_data['title']}' is now being tracked! History will appear below."
+            if product.price_minor is not None:
+                save_price_history(url, product.price_minor, product.timestamp, product.currency)
+                flush_price_history() # The page requests the history right after rendering
+                scrape_scheduler.record_success(url, product.price_minor) # Next scrape is one interval from now
+            else:
+                scrape_scheduler.record_failure(url)
+            message = f"Product '{product_display_info['name']}' is now being tracked! History will appear below."
             message_type = "success"
-            logging.info(f"Tracking new product: {url} - {scraped_data['title']}")
+            logging.info(f"Tracking new product: {url} - {product.title}")
         else:
             message = "Error adding product to tracking database."
             message_type = "error"
@@ -128,21 +225,184 @@ def track():
                            submitted_url=url) # Pass the URL back to the template
 
 
+# --- API Endpoints for Bulk Tracking ---
+def ingest_job_json(job):
+    new_products = job['total'] - job['duplicates'] - job['invalid']
+    return {
+        "job_id": job['id'],
+        "status": job['status'], # queued, running, done or failed
+        "total": job['total'],
+        "new": new_products,
+        "duplicates": job['duplicates'],
+        "invalid": job['invalid'],
+        "scraped": job['scraped'],
+        "failed": job['failed'],
+        "pending": new_products - job['scraped'] - job['failed'],
+        "error": job['error'],
+        "created_at": format_timestamp(job['created_at']),
+        "updated_at": format_timestamp(job['updated_at'])
+    }
+
+@app.route('/api/track/bulk', methods=['POST'])
+def api_track_bulk():
+    """
+    Starts tracking many products at once. Expects a JSON body {"urls": [...]}.
+    URLs are reduced to their product (marketplace and ASIN), and products already tracked or
+    listed twice are skipped. Answers 202 with the job and the URL each submitted URL is tracked
+    under right away; the new products are added and scraped in the background, with progress
+    at /api/track/bulk/<job_id>.
+    """
+    payload = request.get_json(silent=True)
+    urls = payload.get('urls') if isinstance(payload, dict) else None
+    if not isinstance(urls, list) or not urls:
+        return jsonify({"error": "Expected a JSON body with a non-empty 'urls' list"}), 400
+    if len(urls) > app.config['BULK_TRACK_MAX_URLS']:
+        return jsonify({"error": f"At most {app.config['BULK_TRACK_MAX_URLS']} URLs per request"}), 413
+
+    job_id, tracked_urls, invalid_urls = bulk_ingestor.submit(urls)
+    logging.info(f"Bulk tracking job {job_id} queued for {len(urls)} URLs ({len(invalid_urls)} invalid).")
+    body = ingest_job_json(get_ingest_job(job_id))
+    body["tracked_urls"] = tracked_urls # submitted URL -> URL to use with /api/history and /api/alerts
+    body["invalid_urls"] = invalid_urls
+    return jsonify(body), 202, {"Location": url_for('api_track_bulk_status', job_id=job_id)}
+
+@app.route('/api/track/bulk/<job_id>')
+def api_track_bulk_status(job_id):
+    """Progress of a bulk tracking job."""
+    job = get_ingest_job(job_id)
+    if not job:
+        return jsonify({"error": "Bulk tracking job not found"}), 404
+    return jsonify(ingest_job_json(job))
+
+
+# --- API Endpoints for Price Alerts ---
+@app.route('/api/alerts', methods=['POST'])
+def api_create_alert():
+    """
+    Creates a price alert for a tracked product. Expects a JSON body with
+      url          -- the product
+      kind         -- 'target_price' or 'percent_drop'
+      target_price -- for target_price: alert when the price is at or below this (e.g. "1,299.00")
+      percent      -- for percent_drop: alert when the price is this many percent below its highest since now
+      currency     -- optional; must be the currency of the product's prices, which is the default
+    Alerts fire once when their condition becomes true, and again only after it stopped holding.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('url'), str):
+        return jsonify({"error": "Expected a JSON body with the product 'url'"}), 400
+    kind = payload.get('kind')
+    if kind not in ALERT_KINDS:
+        return jsonify({"error": f"Invalid 'kind', expected one of: {', '.join(ALERT_KINDS)}"}), 400
+
+    url = tracked_url(payload['url']) or payload['url']
+    latest = get_latest_price(url)
+    product_currency = (latest['currency'] if latest else None) or currency_for_url(url)
+    currency = payload.get('currency')
+    if currency is not None:
+        # Points in another currency are skipped when evaluating the rule, so it could never fire
+        if not isinstance(currency, str) or (product_currency and currency.upper() != product_currency):
+            return jsonify({"error": f"Invalid 'currency', expected {product_currency or 'a currency code'}"}), 400
+        currency = currency.upper()
+    currency = currency or product_currency
+
+    target_minor = None
+    percent = None
+    if kind == 'target_price':
+        target_minor = parse_price(str(payload.get('target_price', '')), currency)
+        if not target_minor or target_minor < 0:
+            return jsonify({"error": "Invalid or missing 'target_price'"}), 400
+    else:
+        try:
+            percent = float(payload.get('percent'))
+        except (TypeError, ValueError):
+            percent = None
+        if percent is None or not 0 < percent < 100:
+            return jsonify({"error": "Invalid or missing 'percent', expected a number between 0 and 100"}), 400
+
+    rule_id = create_alert_rule(url, kind, currency, int(time.time()), target_minor=target_minor, percent=percent)
+    if rule_id is None:
+        return jsonify({"error": "Product not tracked or not found"}), 404
+    logging.info(f"Created {kind} alert {rule_id} for {url}")
+    return jsonify(get_alert_rules(rule_id=rule_id)[0]), 201
+
+@app.route('/api/alerts')
+def api_list_alerts():
+    """Alert rules with their current state; only those of one product with ?url=..."""
+    url = request.args.get('url')
+    if url:
+        url = tracked_url(url) or url
+    return jsonify({"rules": get_alert_rules(product_url=url)})
+
+
 # --- API Endpoint for Historical Data ---
+def parse_time_arg(value):
+    """Parses a `from`/`to` query argument given as epoch seconds or an ISO date/datetime."""
+    if value.isdigit():
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp())
+
+def cached_json_response(entry):
+    """Serves a cached body with validators; answers 304 if the client's copy is current."""
+    response = Response(entry.body, mimetype='application/json')
+    response.set_etag(entry.etag)
+    response.last_modified = datetime.fromtimestamp(entry.last_modified, timezone.utc)
+    response.cache_control.no_cache = True # Browsers revalidate on every poll and get 304s
+    return response.make_conditional(request)
+
 @app.route('/api/history/<path:product_url>')
 def api_product_history(product_url):
+    """
+    Price history of a tracked product. Optional query arguments:
+      from, to    -- limit the range (epoch seconds or ISO date/datetime; local time unless it has an offset or Z)
+      bucket      -- '1h' or '1d': return precomputed open/high/low/close rollups instead of raw points.
+                     Buckets are UTC hours/days and their timestamps are UTC (e.g. "2025-05-23T00:00:00Z");
+                     raw points are timestamped in the server's local time
+      max_points  -- downsample the raw points to at most this many (3 or more) with LTTB
+    Responses are cached per product and query string until the product is written.
+    """
     logging.info(f"API request for history of: {product_url}")
-    history_data = get_product_price_history(product_url)
-    product_details = get_tracked_product_details(product_url)
+    variant = request.query_string
+    cached = history_cache.get(history_cache.resolve(product_url), variant)
+    if cached is not None and cached.is_fresh():
+        return cached_json_response(cached)
+    # Any URL of a tracked product works, e.g. the one submitted for bulk tracking; it is
+    # looked up by product key only on a cache miss, and remembered as an alias after that
+    requested_url = product_url
+    product_url = tracked_url(requested_url) or requested_url
+    generation = history_cache.generation(product_url)
+
+    try:
+        start = parse_time_arg(request.args['from']) if 'from' in request.args else None
+        end = parse_time_arg(request.args['to']) if 'to' in request.args else None
+        max_points = int(request.args['max_points']) if 'max_points' in request.args else None
+    except ValueError:
+        return jsonify({"error": "Invalid 'from', 'to' or 'max_points' parameter"}), 400
+    if max_points is not None and max_points < 3:
+        return jsonify({"error": "Invalid 'max_points', expected at least 3"}), 400
+    bucket = request.args.get('bucket')
+    if bucket is not None and bucket not in ROLLUP_BUCKETS:
+        return jsonify({"error": f"Invalid 'bucket', expected one of: {', '.join(ROLLUP_BUCKETS)}"}), 400
 
+    product_details = get_tracked_product_details(product_url)
     if not product_details:
         return jsonify({"error": "Product not tracked or not found"}), 404
 
-    return jsonify({
+    if bucket:
+        history_data = get_product_price_rollup(product_url, bucket, start, end)
+    else:
+        points = get_product_price_points(product_url, start, end)
+        if max_points is not None:
+            points = lttb(points, max_points)
+        history_data = format_price_points(points)
+
+    response = jsonify({
         "product_title": product_details.get("title", "N/A"),        # Ensure this is sent
         "product_image_url": product_details.get("image_url"),      # Ensure this is sent
         "history": history_data if history_data is not None else [] # Ensure history is always a list
     })
+    entry = history_cache.put(product_url, variant, response.get_data(), generation)
+    history_cache.add_alias(requested_url, product_url)
+    return cached_json_response(entry)
 
 if __name__ == '__main__':
     app.run(debug=True, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,268 @@
+"""
+Offline benchmarks for the scrape -> parse -> store -> serve pipeline.
+
+Everything runs against the local stub server (stub_server.py) and a throwaway
+database in a temporary directory; nothing touches the network or pricepulse.db.
+Results are printed as JSON (or written with --output) so runs can be compared
+between versions. Run from the backend directory:
+
+    python benchmarks/bench.py
+    python benchmarks/bench.py --only parse,api --output bench.json
+    python benchmarks/bench.py --sweep-sizes 100,1000,10000 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from stub_server import StubProductServer, load_fixtures
+
+BENCHMARKS = ('parse', 'db', 'sweep', 'api')
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_parse(args):
+    """Parse time per fixture page, and fetch_amazon_data/get_amazon_image end to end against a zero-latency stub."""
+    from amazon_image_scraper import get_amazon_image
+    from amazon_scraper import fetch_amazon_data
+    from product_extractor import parse_product_page
+    from stub_server import FIXTURES_DIR
+
+    names = [path.stem for path in sorted(FIXTURES_DIR.glob('*.html'))]
+    results = {'page_padding_kb': args.padding_kb, 'parse_product_page': {}}
+    for name, page in zip(names, load_fixtures(args.padding_kb)):
+        result = summarize(timed(lambda: parse_product_page(page), args.repeat))
+        result['page_bytes'] = len(page)
+        results['parse_product_page'][name] = result
+
+    with StubProductServer(padding_kb=args.padding_kb) as server:
+        urls = [server.url_for(index) for index in range(args.repeat)]
+        headers = {"User-Agent": "pricepulse-bench", "Accept-Language": "en-US,en;q=0.9"}
+        url_iter = iter(urls * 2)
+        results['fetch_amazon_data'] = summarize(timed(lambda: fetch_amazon_data(next(url_iter)), args.repeat))
+        results['get_amazon_image'] = summarize(timed(lambda: get_amazon_image(next(url_iter), headers), args.repeat))
+    return results
+
+
+def bench_db(args):
+    """Insert throughput of the price writer and history query latency as price_history grows."""
+    import database
+
+    products = [f"https://bench.invalid/dp/DB{index:08d}" for index in range(args.db_products)]
+    with database.db_connection() as conn:
+        conn.executemany("INSERT OR IGNORE INTO tracked_products (url, title) VALUES (?, 'bench')",
+                         [(url,) for url in products])
+        conn.commit()
+
+    results = []
+    inserted = 0
+    timestamp = 1_700_000_000
+    prices = {url: 100_000 for url in products}
+    for size in args.db_sizes:
+        start = time.perf_counter()
+        while inserted < size:
+            url = products[inserted % len(products)]
+            if random.random() < args.change_rate:
+                prices[url] += random.choice((-500, 500))
+            database.save_price_history(url, prices[url], timestamp, 'INR')
+            inserted += 1
+            if inserted % len(products) == 0:
+                timestamp += 300 # one sweep every 5 minutes
+        database.flush_price_history()
+        insert_seconds = time.perf_counter() - start
+
+        with database.db_connection() as conn:
+            stored_rows = conn.execute("SELECT COUNT(*) FROM price_history").fetchone()[0]
+
+        sample = random.sample(products, min(len(products), args.repeat))
+        full = timed(lambda: database.get_product_price_points(random.choice(sample)), args.repeat)
+        last_day = timed(lambda: database.get_product_price_points(random.choice(sample), timestamp - 86400, timestamp),
+                         args.repeat)
+        results.append({
+            'points_ingested': size,
+            'price_history_rows': stored_rows,
+            'insert_points_per_second': (size - (results[-1]['points_ingested'] if results else 0)) / insert_seconds,
+            'query_full_history': summarize(full),
+            'query_last_day': summarize(last_day),
+        })
+    return results
+
+
+def bench_sweep(args):
+    """Duration and throughput of scheduled_scrape_task over N products, first with cold and then warm fetch caches."""
+    import app
+    from database import db_connection
+    from scrape_scheduler import AdaptiveScheduler
+
+    results = []
+    with StubProductServer(latency=args.latency, latency_jitter=args.latency_jitter,
+                           error_rate=args.error_rate, padding_kb=args.padding_kb) as server:
+        offset = 0
+        for size in args.sweep_sizes:
+            urls = [server.url_for(offset + index) for index in range(size)]
+            offset += size
+            with db_connection() as conn:
+                conn.executemany("INSERT OR IGNORE INTO tracked_products (url, title) VALUES (?, 'bench')",
+                                 [(url,) for url in urls])
+                conn.commit()
+
+            result = {'products': size}
+            for run in ('cold', 'warm'):
+                # A fresh scheduler with every product due now, so the task scrapes exactly this set
+                app.scrape_scheduler = AdaptiveScheduler()
+                app.scrape_scheduler.load([{'url': url, 'change_count': 0, 'history_span': 0,
+                                            'last_price': None, 'last_checked_at': None} for url in urls])
+                start = time.perf_counter()
+                summary = app.scheduled_scrape_task()
+                duration = time.perf_counter() - start
+                result[run] = {'seconds': duration, 'products_per_second': size / duration,
+                               'outcomes': summary['outcomes'], 'slowest': summary['slowest']}
+            results.append(result)
+    return {
+        'latency_s': args.latency,
+        'latency_jitter_s': args.latency_jitter,
+        'error_rate': args.error_rate,
+        'max_workers': args.workers,
+        'runs': results,
+    }
+
+
+def bench_api(args):
+    """/api/history latency through the Flask test client: uncached, cached, 304 revalidation and downsampled/bucketed."""
+    import app
+    import database
+
+    url = "https://bench.invalid/dp/API0000001"
+    database.add_or_update_tracked_product(url, 'bench', None)
+    price = 100_000
+    timestamp = 1_700_000_000
+    for _ in range(args.api_points):
+        if random.random() < args.change_rate:
+            price += random.choice((-500, 500))
+        database.save_price_history(url, price, timestamp, 'INR')
+        timestamp += 300
+    database.flush_price_history()
+
+    client = app.app.test_client()
+    path = f"/api/history/{url}"
+
+    def uncached(query=''):
+        app.history_cache.invalidate(url)
+        client.get(path + query)
+
+    etag = client.get(path).headers['ETag']
+    return {
+        'history_points': args.api_points,
+        'uncached': summarize(timed(uncached, args.repeat)),
+        'uncached_max_points_800': summarize(timed(lambda: uncached('?max_points=800'), args.repeat)),
+        'uncached_bucket_1d': summarize(timed(lambda: uncached('?bucket=1d'), args.repeat)),
+        'cached': summarize(timed(lambda: client.get(path), args.repeat)),
+        'not_modified': summarize(timed(lambda: client.get(path, headers={'If-None-Match': etag}), args.repeat)),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline PricePulse pipeline benchmarks")
+    parser.add_argument('--only', default=','.join(BENCHMARKS), help=f"comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--output', help="write JSON results to this file instead of stdout")
+    parser.add_argument('--repeat', type=int, default=200, help="samples per latency measurement")
+    parser.add_argument('--padding-kb', type=int, default=400, help="filler added to fixture pages to approach real page size")
+    parser.add_argument('--sweep-sizes', type=int_list, default=[100, 1000, 10000])
+    parser.add_argument('--latency', type=float, default=0.02, help="stub server latency per request (seconds)")
+    parser.add_argument('--latency-jitter', type=float, default=0.01)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, default=32, help="scrape engine max workers (and per-host limit)")
+    parser.add_argument('--db-sizes', type=int_list, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--db-products', type=int, default=1000)
+    parser.add_argument('--api-points', type=int, default=50_000)
+    parser.add_argument('--change-rate', type=float, default=0.05, help="probability a scraped price differs from the last one")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    selected = [name for name in args.only.split(',') if name]
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    random.seed(args.seed)
+
+    # The app modules read these at import time, so they are set before anything is imported
+    workdir = tempfile.mkdtemp(prefix='pricepulse-bench-')
+    os.environ['PRICEPULSE_DB'] = os.path.join(workdir, 'bench.db')
+    os.environ['SCRAPE_SCHEDULER_ENABLED'] = '0'
+    os.environ['SCRAPE_MAX_WORKERS'] = str(args.workers)
+    os.environ['SCRAPE_PER_HOST_LIMIT'] = str(args.workers) # every stub URL shares one host
+    os.environ['SCRAPE_MIN_DELAY'] = '0'
+    os.environ['SCRAPE_JITTER'] = '0'
+    logging.disable(logging.WARNING) # per-product log lines would dominate sweep timings
+
+    import database
+    database.init_db()
+
+    report = {
+        'git_commit': git_commit(),
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': vars(args),
+        'results': {},
+    }
+    for name in selected:
+        start = time.perf_counter()
+        # The scrapers report failures with print(); keep stdout for the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            report['results'][name] = globals()[f'bench_{name}'](args)
+        print(f"{name}: {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Local stand-in for Amazon product pages, so benchmarks never touch the network.
+
+Serves the HTML fixtures in benchmarks/fixtures at /dp/<ASIN> (the fixture is picked
+by hashing the ASIN, so a URL always gets the same page) with configurable latency
+and error rate. Run it on its own with:
+
+    python benchmarks/stub_server.py --port 8900 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+
+# Filler appended to fixtures so pages approach the size of real product pages,
+# which carry hundreds of kilobytes of recommendations, reviews and scripts
+FILLER_BLOCK = (
+    '<div class="a-carousel-card"><a class="a-link-normal" href="/dp/B000000000">'
+    '<img src="https://m.media-amazon.com/images/I/placeholder._AC_UL160_.jpg" alt="Related product">'
+    '<span class="a-size-small a-color-base">Related product with a long descriptive title</span></a></div>\n'
+)
+
+
+def load_fixtures(padding_kb=0):
+    """Returns the fixture pages as bytes, each padded with about `padding_kb` KB of filler markup."""
+    filler = FILLER_BLOCK * (padding_kb * 1024 // len(FILLER_BLOCK))
+    pages = []
+    for path in sorted(FIXTURES_DIR.glob('*.html')):
+        html = path.read_text(encoding='utf-8')
+        pages.append(html.replace('</body>', f'<div id="rhf">{filler}</div></body>').encode('utf-8'))
+    return pages
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128 # the default of 5 drops connections under a concurrent sweep
+
+
+class StubProductServer:
+    """
+    Threaded HTTP server serving fixture pages. Each request waits `latency` seconds
+    (plus up to `latency_jitter`) and fails with a 503 with probability `error_rate`.
+    Usable as a context manager; runs in a background thread.
+    """
+
+    def __init__(self, port=0, latency=0.0, latency_jitter=0.0, error_rate=0.0, padding_kb=0):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.pages = load_fixtures(padding_kb)
+        self._httpd = _HTTPServer(('127.0.0.1', port), self._make_handler())
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._httpd.server_address[1]
+
+    def url_for(self, index):
+        return f"http://127.0.0.1:{self.port}/dp/B{index:09d}"
+
+    def page_for(self, path):
+        return self.pages[zlib.crc32(path.encode()) % len(self.pages)]
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # keep-alive, so pooled sessions reuse connections
+
+            def do_GET(self):
+                delay = server.latency + random.uniform(0, server.latency_jitter)
+                if delay:
+                    time.sleep(delay)
+                if random.random() < server.error_rate:
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = server.page_for(self.path)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='stub-product-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve product page fixtures locally")
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--latency-jitter', type=float, default=0.0, help="up to this many extra seconds per response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument('--padding-kb', type=int, default=0, help="filler markup added to each page")
+    args = parser.parse_args()
+
+    server = StubProductServer(args.port, args.latency, args.latency_jitter, args.error_rate, args.padding_kb)
+    print(f"Serving {len(server.pages)} fixture pages on http://127.0.0.1:{server.port}/dp/<ASIN>")
+    server._httpd.serve_forever()
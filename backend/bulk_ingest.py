@@ -0,0 +1,109 @@
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from database import (
+    add_tracked_products,
+    add_tracked_products_for_workers,
+    create_ingest_job,
+    get_tracked_urls_by_key,
+    update_ingest_job,
+    update_tracked_product_details
+)
+from product_keys import canonical_url, product_key
+from sweep import run_sweep
+
+# Products scraped per run_sweep() call; progress is written after each chunk
+DEFAULT_CHUNK_SIZE = 200
+
+
+class BulkIngestor:
+    """
+    Tracks many product URLs at once. submit() canonicalizes the URLs to product keys, drops
+    duplicates (within the request and against tracked products), records an ingest job and
+    returns straight away. A single background thread then adds the new products and scrapes
+    them in chunks, writing progress to the ingest_jobs table so any web process can report it.
+
+    With `scrape=False`, when scraping is left to worker.py processes, the thread only adds the
+    products with scrape jobs due right away (at `job_interval`) and the workers make the progress.
+    """
+
+    def __init__(self, engine, fetch_cache, on_result=None, chunk_size=DEFAULT_CHUNK_SIZE, slowest=5,
+                 scrape=True, job_interval=None):
+        self.engine = engine
+        self.fetch_cache = fetch_cache
+        self.on_result = on_result # also called for every scraped product, e.g. to queue it in the scheduler
+        self.chunk_size = chunk_size
+        self.slowest = slowest
+        self.scrape = scrape
+        self.job_interval = job_interval
+        # One job at a time; each job already scrapes concurrently through the engine
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bulk-ingest')
+
+    def submit(self, urls):
+        """
+        Queues the new products among `urls` for tracking. Returns (job_id, tracked_urls, invalid_urls),
+        where tracked_urls maps each valid submitted URL to the URL its product is tracked under.
+        """
+        products = {} # product key -> canonical URL, first occurrence wins
+        submitted_keys = {} # submitted URL -> product key
+        invalid = []
+        for url in urls:
+            key = product_key(url) if isinstance(url, str) else None
+            if key is None:
+                invalid.append(url)
+                continue
+            submitted_keys[url] = key
+            if key not in products:
+                products[key] = canonical_url(url)
+        already_tracked = get_tracked_urls_by_key(products)
+        new_products = {key: url for key, url in products.items() if key not in already_tracked}
+        tracked_urls = {url: already_tracked.get(key) or products[key] for url, key in submitted_keys.items()}
+
+        job_id = uuid.uuid4().hex
+        create_ingest_job(job_id, total=len(urls), duplicates=len(urls) - len(invalid) - len(new_products),
+                          invalid=len(invalid), now=int(time.time()))
+        self._executor.submit(self._run, job_id, new_products)
+        return job_id, tracked_urls, invalid
+
+    def _run(self, job_id, new_products):
+        scraped = failed = 0
+        try:
+            if not self.scrape:
+                added = add_tracked_products_for_workers(
+                    job_id, [(url, key) for key, url in new_products.items()], self.job_interval, int(time.time()))
+                logging.info(f"Bulk tracking job {job_id} queued {added} products for the scrape workers.")
+                return
+            update_ingest_job(job_id, 'running', scraped, failed, int(time.time()))
+            add_tracked_products([(url, key) for key, url in new_products.items()])
+            # Scrape whatever URL each key ended up stored under, in case it was tracked meanwhile
+            stored = get_tracked_urls_by_key(new_products)
+            urls = [stored[key] for key in new_products if key in stored]
+
+            for start in range(0, len(urls), self.chunk_size):
+                details = []
+
+                def record_outcome(url, outcome, product):
+                    nonlocal scraped, failed
+                    if outcome in ('saved', 'unchanged'):
+                        scraped += 1
+                    else:
+                        failed += 1
+                    if product:
+                        details.append((product.title, product.image_url, url))
+                    if self.on_result:
+                        self.on_result(url, outcome, product)
+
+                run_sweep(urls[start:start + self.chunk_size], self.engine, self.fetch_cache, record_outcome,
+                          self.slowest)
+                update_tracked_product_details(details)
+                update_ingest_job(job_id, 'running', scraped, failed, int(time.time()))
+            update_ingest_job(job_id, 'done', scraped, failed, int(time.time()))
+            logging.info(f"Bulk tracking job {job_id} finished: {scraped} scraped, {failed} failed.")
+        except Exception as e:
+            logging.error(f"Bulk tracking job {job_id} failed: {e}")
+            update_ingest_job(job_id, 'failed', scraped, failed, int(time.time()), error=str(e))
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,64 @@
+import sqlite3
+import sys
+
+from database import DATABASE_NAME # honours PRICEPULSE_DB
+from migrations import migrate, schema_version
+
+
+def merge_adjacent_intervals(conn):
+    """Merges consecutive intervals of a product that ended up with the same price. Returns the number of rows removed."""
+    rows = conn.execute('''
+        SELECT product_id, price_minor, currency, first_seen, last_seen, samples FROM price_history
+        ORDER BY product_id, first_seen, id
+    ''').fetchall()
+
+    merged = []
+    for row in rows:
+        previous = merged[-1] if merged else None
+        if previous and tuple(previous[:3]) == tuple(row[:3]):
+            previous[4] = max(previous[4], row['last_seen'])
+            previous[5] += row['samples']
+        else:
+            merged.append(list(row))
+
+    if len(merged) == len(rows):
+        return 0
+    conn.execute("DELETE FROM price_history")
+    conn.executemany('''
+        INSERT INTO price_history (product_id, price_minor, currency, first_seen, last_seen, samples)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', merged)
+    return len(rows) - len(merged)
+
+
+def compact(database_name):
+    """
+    Converts a database to interval storage: runs any pending migrations (which collapse
+    per-scrape price points into intervals), merges leftover duplicate intervals and
+    reclaims the freed space.
+    """
+    conn = sqlite3.connect(database_name)
+    conn.row_factory = sqlite3.Row
+
+    version_before = schema_version(conn)
+    # Only a database with a schema has rows to count; a new one is just created by migrate()
+    has_history = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'price_history'").fetchone() is not None
+    rows_before = conn.execute("SELECT COUNT(*) FROM price_history").fetchone()[0] if has_history else 0
+    migrate(conn)
+    version_after = schema_version(conn)
+
+    conn.execute("BEGIN IMMEDIATE")
+    removed = merge_adjacent_intervals(conn)
+    conn.commit()
+    conn.execute("VACUUM")
+
+    rows_after = conn.execute("SELECT COUNT(*) FROM price_history").fetchone()[0]
+    conn.close()
+
+    print(f"Schema version: {version_before} -> {version_after}")
+    print(f"price_history rows: {rows_before} -> {rows_after} ({removed} duplicate intervals merged)")
+
+
+if __name__ == "__main__":
+    compact(sys.argv[1] if len(sys.argv) > 1 else DATABASE_NAME)
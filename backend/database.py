@@ -1,114 +1,795 @@
+import atexit
+import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 
-DATABASE_NAME = 'pricepulse.db'
+from alerts import evaluate_alerts, threshold_minor
+from metrics import DB_FLUSH_ERRORS, DB_FLUSH_ROWS, DB_FLUSH_SECONDS
+from migrations import migrate, points_to_intervals
+from pricing import format_price, format_timestamp, format_utc_timestamp, parse_price, to_epoch
+from product_keys import product_key
+from rollups import ROLLUP_BUCKETS, update_rollups
+
+DATABASE_NAME = os.environ.get('PRICEPULSE_DB', 'pricepulse.db')
+
+# Applied to every connection. WAL lets readers (Flask requests) run while the
+# scheduler writes; synchronous=NORMAL is safe in WAL mode and only fsyncs at checkpoints.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",  # 16 MB page cache
+    "PRAGMA temp_store=MEMORY",
+)
+
+# How many idle connections the pool keeps open
+POOL_SIZE = 8
+
+# Write-behind queue for price points: flushed when it holds PRICE_BATCH_SIZE rows
+# or PRICE_FLUSH_INTERVAL seconds after the first pending row, whichever comes first
+PRICE_BATCH_SIZE = 500
+PRICE_FLUSH_INTERVAL = 0.5
+# Failed flushes in a row (e.g. "database is locked") after which the pending points are dropped
+PRICE_FLUSH_RETRIES = 3
 
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = sqlite3.connect(DATABASE_NAME, check_same_thread=False)
     conn.row_factory = sqlite3.Row # Allows accessing columns by name
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Table to store products users want to track
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tracked_products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            url TEXT UNIQUE NOT NULL,
-            title TEXT,
-            image_url TEXT,
-            last_checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # Table to store price history for each tracked product
-    # 'product_id' will be a foreign key to 'tracked_products.id'
-    # For simplicity now, we'll just store the URL directly, but a FK is better practice.
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS price_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            product_url TEXT NOT NULL,
-            price TEXT,
-            timestamp TEXT NOT NULL,
-            FOREIGN KEY (product_url) REFERENCES tracked_products (url) ON DELETE CASCADE
-        )
-    ''')
-    conn.commit()
-    conn.close()
 
-# Function to add a product to be tracked (or update its title/image)
-def add_or_update_tracked_product(url, title, image_url):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute('''
-            INSERT INTO tracked_products (url, title, image_url)
-            VALUES (?, ?, ?)
-            ON CONFLICT(url) DO UPDATE SET
-            title=excluded.title,
-            image_url=excluded.image_url,
-            last_checked_at=CURRENT_TIMESTAMP
-        ''', (url, title, image_url))
-        product_id = cursor.lastrowid
-        if not product_id: # if ON CONFLICT occurred, get the existing id
-             cursor.execute("SELECT id FROM tracked_products WHERE url = ?", (url,))
-             row = cursor.fetchone()
-             if row:
-                 product_id = row['id']
-        conn.commit()
-        return product_id
-    except sqlite3.IntegrityError as e:
-        print(f"Error adding/updating tracked product {url}: {e}")
-        return None
-    finally:
+class ConnectionPool:
+    """
+    Keeps up to `size` long-lived connections and lends them to one thread at a time,
+    so Flask request threads and the scheduler stop paying for a connect per query.
+    """
+
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return get_db_connection()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
         conn.close()
 
-# Function to save a new price point for a product
-def save_price_history(product_url, price, timestamp):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pool = ConnectionPool()
+
+# Callbacks run with a product URL after that product's data was committed (see add_write_listener)
+_write_listeners = []
+# Callbacks run with the list of alerts fired by a committed batch of price points (see add_alert_listener)
+_alert_listeners = []
+
+@contextmanager
+def db_connection():
+    """Borrows a pooled connection for the duration of the `with` block."""
+    conn = _pool.acquire()
     try:
-        cursor.execute('''
-            INSERT INTO price_history (product_url, price, timestamp)
-            VALUES (?, ?, ?)
-        ''', (product_url, price, timestamp))
-        conn.commit()
-    except Exception as e:
-        print(f"Error saving price history for {product_url}: {e}")
+        yield conn
     finally:
-        conn.close()
+        _pool.release(conn)
+
+
+class PriceHistoryWriter:
+    """
+    Write-behind queue for price points. save_price_history() only appends to an
+    in-memory list; a background thread writes pending points in one transaction
+    per batch, so a sweep costs one commit per batch instead of one per product.
+    A batch that fails to write goes back to the front of the queue and is retried
+    with the next flush, up to `max_retries` times.
+    """
+
+    def __init__(self, batch_size=PRICE_BATCH_SIZE, flush_interval=PRICE_FLUSH_INTERVAL,
+                 max_retries=PRICE_FLUSH_RETRIES):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._pending = []
+        self._failures = 0 # flushes failed in a row
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock() # Keeps batches in order when flush() is also called directly
+        self._thread = None
+        self._stopped = False
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='price-history-writer', daemon=True)
+            self._thread.start()
+
+    def add(self, product_url, price_minor, currency, timestamp):
+        with self._condition:
+            self._pending.append((product_url, price_minor, currency, timestamp))
+            self._ensure_thread()
+            # Wake the writer for the first pending row (starts the flush timer) and for a full batch
+            if len(self._pending) in (1, self.batch_size):
+                self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                if len(self._pending) < self.batch_size:
+                    # Give the batch a chance to fill up before writing it
+                    self._condition.wait(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Writes all pending price points in a single transaction. Returns False if that failed."""
+        with self._flush_lock:
+            with self._condition:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return True
+            start = time.perf_counter()
+            with db_connection() as conn:
+                try:
+                    conn.execute("BEGIN IMMEDIATE") # Latest intervals must not change between read and write
+                    alerts = _write_price_points(conn, batch)
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    DB_FLUSH_ERRORS.inc()
+                    self._retry_later(batch, e)
+                    return False
+            self._failures = 0
+            DB_FLUSH_SECONDS.observe(time.perf_counter() - start)
+            DB_FLUSH_ROWS.inc(amount=len(batch))
+            _notify_written({point[0] for point in batch})
+            _notify_alerts(alerts)
+            return True
+
+    def _retry_later(self, batch, error):
+        self._failures += 1
+        if self._failures > self.max_retries:
+            self._failures = 0
+            print(f"Error saving batch of {len(batch)} price history rows, dropping it after "
+                  f"{self.max_retries} retries: {error}")
+            return
+        print(f"Error saving batch of {len(batch)} price history rows, will retry: {error}")
+        with self._condition:
+            self._pending[:0] = batch # Keeps the points in order ahead of any added since
+            if not self._stopped:
+                self._ensure_thread()
+                self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        while not self.flush() and self._pending: # Retry a failed final flush like the writer thread would
+            pass
+
+
+def _select_in(conn, sql, values, chunk_size=500):
+    """
+    Rows of `sql` for all `values`, where `sql` has an `IN ({placeholders})` clause. The values
+    are bound in chunks to stay below SQLite's bound-parameter limit.
+    """
+    values = list(values)
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start:start + chunk_size]
+        yield from conn.execute(sql.format(placeholders=','.join('?' * len(chunk))), chunk)
+
+def _product_ids(conn, urls):
+    rows = _select_in(conn, "SELECT id, url FROM tracked_products WHERE url IN ({placeholders})", urls)
+    return {row['url']: row['id'] for row in rows}
+
+def _fill_unchanged_prices(product_points, latest):
+    """
+    Gives points queued by save_unchanged_price() (price_minor None) the price before them:
+    the previous point of the batch, or else the product's latest stored interval.
+    Such points are dropped if the product has no price yet.
+    """
+    current = (latest['price_minor'], latest['currency']) if latest else None
+    filled = []
+    for product_id, price_minor, currency, timestamp in product_points:
+        if price_minor is None:
+            if current is None:
+                continue
+            price_minor, currency = current
+        current = (price_minor, currency)
+        filled.append((product_id, price_minor, currency, timestamp))
+    return filled
+
+def _write_price_points(conn, points):
+    """
+    Stores (product_url, price_minor, currency, timestamp) points as price change intervals
+    (price_minor None: unchanged since the previous point, see save_unchanged_price()):
+    a point at the product's latest price only moves that interval's last_seen forward,
+    any other price starts a new interval. Also folds the points into the rollups and
+    evaluates the products' alert rules; returns the alerts fired.
+    """
+    product_ids = _product_ids(conn, {point[0] for point in points})
+    points_by_product = {}
+    for product_url, price_minor, currency, timestamp in points:
+        product_id = product_ids.get(product_url)
+        if product_id is None:
+            print(f"Error saving price history for {product_url}: product is not tracked")
+            continue
+        points_by_product.setdefault(product_id, []).append((product_id, price_minor, currency, timestamp))
+
+    extended = []
+    inserted = []
+    for product_id, product_points in list(points_by_product.items()):
+        product_points.sort(key=lambda point: point[3])
+        latest = conn.execute('''
+            SELECT id, price_minor, currency, last_seen FROM price_history
+            WHERE product_id = ?
+            ORDER BY first_seen DESC LIMIT 1
+        ''', (product_id,)).fetchone()
+        product_points = _fill_unchanged_prices(product_points, latest)
+        if not product_points:
+            del points_by_product[product_id]
+            continue
+        points_by_product[product_id] = product_points
+        intervals = list(points_to_intervals(product_points))
+        first = intervals[0]
+        if latest and (latest['price_minor'], latest['currency']) == (first[1], first[2]):
+            extended.append((max(latest['last_seen'], first[4]), first[5], latest['id']))
+            intervals = intervals[1:]
+        inserted.extend(intervals)
+
+    conn.executemany("UPDATE price_history SET last_seen = ?, samples = samples + ? WHERE id = ?", extended)
+    conn.executemany('''
+        INSERT INTO price_history (product_id, price_minor, currency, first_seen, last_seen, samples)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', inserted)
+    update_rollups(conn, [point for product_points in points_by_product.values() for point in product_points])
+    product_urls = {product_id: product_url for product_url, product_id in product_ids.items()}
+    rules = _select_in(conn, "SELECT * FROM alert_rules WHERE enabled = 1 AND product_id IN ({placeholders})",
+                       points_by_product)
+    return evaluate_alerts(conn, [dict(rule) for rule in rules], points_by_product, product_urls)
+
+
+_price_writer = PriceHistoryWriter()
+
+def init_db():
+    # Creates the schema on a new database and upgrades an existing one (see migrations.py)
+    with db_connection() as conn:
+        migrate(conn)
+
+# Function to register a callback that is called with a product URL whenever that product's
+# row or price history was written, e.g. to invalidate cached API responses
+def add_write_listener(callback):
+    _write_listeners.append(callback)
+
+# Function to register a callback that is called with the list of alerts (dicts, see alerts.py)
+# fired by each committed batch of price points, e.g. AlertNotifier.enqueue
+def add_alert_listener(callback):
+    _alert_listeners.append(callback)
+
+def _notify_alerts(alerts):
+    if not alerts:
+        return
+    for callback in _alert_listeners:
+        try:
+            callback(alerts)
+        except Exception as e:
+            print(f"Error in alert listener: {e}")
+
+def _notify_written(product_urls):
+    for product_url in product_urls:
+        for callback in _write_listeners:
+            try:
+                callback(product_url)
+            except Exception as e:
+                print(f"Error in write listener for {product_url}: {e}")
+
+# Function to add a product to be tracked (or update its title/image)
+def add_or_update_tracked_product(url, title, image_url):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                INSERT INTO tracked_products (url, title, image_url, product_key)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                title=excluded.title,
+                image_url=excluded.image_url,
+                last_checked_at=CURRENT_TIMESTAMP
+            ''', (url, title, image_url, product_key(url)))
+            # lastrowid is not reliable here: pooled connections keep it from earlier inserts,
+            # and ON CONFLICT updates don't set it, so always look the id up
+            cursor.execute("SELECT id FROM tracked_products WHERE url = ?", (url,))
+            row = cursor.fetchone()
+            product_id = row['id'] if row else None
+            conn.commit()
+        except sqlite3.IntegrityError as e:
+            print(f"Error adding/updating tracked product {url}: {e}")
+            return None
+    _notify_written([url])
+    return product_id
+
+# Function to get the stored URLs of tracked products by product key (see product_keys.py), as a dict key -> url
+def get_tracked_urls_by_key(keys):
+    with db_connection() as conn:
+        rows = _select_in(conn, "SELECT product_key, url FROM tracked_products WHERE product_key IN ({placeholders})",
+                          keys)
+        return {row['product_key']: row['url'] for row in rows}
+
+# Function to start tracking many products at once, given as (url, product_key) pairs.
+# They are added without title or image and as never checked, so they are due for a scrape right away.
+# Products already tracked under the same URL or key are skipped. Returns the number added
+def add_tracked_products(products):
+    with db_connection() as conn:
+        try:
+            cursor = conn.executemany('''
+                INSERT OR IGNORE INTO tracked_products (url, product_key, last_checked_at)
+                VALUES (?, ?, NULL)
+            ''', products)
+            conn.commit()
+            return cursor.rowcount
+        except Exception as e:
+            print(f"Error adding tracked products: {e}")
+            return 0
+
+# Function to fill in scraped titles and images, given as (title, image_url, url) tuples; None keeps the stored value
+def update_tracked_product_details(details):
+    if not details:
+        return
+    with db_connection() as conn:
+        try:
+            conn.executemany('''
+                UPDATE tracked_products SET
+                title = COALESCE(?, title),
+                image_url = COALESCE(?, image_url)
+                WHERE url = ?
+            ''', details)
+            conn.commit()
+        except Exception as e:
+            print(f"Error updating product details: {e}")
+            return
+    _notify_written([url for _, _, url in details])
+
+# Function to fill in titles and images only where none is stored yet (products added without them,
+# e.g. by bulk tracking), given as (title, image_url, url) tuples
+def fill_missing_product_details(details):
+    if not details:
+        return
+    with db_connection() as conn:
+        try:
+            conn.executemany('''
+                UPDATE tracked_products SET
+                title = COALESCE(title, ?),
+                image_url = COALESCE(image_url, ?)
+                WHERE url = ? AND (title IS NULL OR image_url IS NULL)
+            ''', details)
+            conn.commit()
+        except Exception as e:
+            print(f"Error filling in product details: {e}")
+            return
+    _notify_written([url for _, _, url in details])
+
+# Function to save a new price point for a product.
+# `price` is either the price text as scraped (e.g. "1,299.") or an amount in minor units,
+# `timestamp` a "YYYY-MM-DD HH:MM:SS" string or epoch seconds.
+# The row is queued and written by the background writer; call flush_price_history()
+# when it has to be visible to readers right away.
+def save_price_history(product_url, price, timestamp, currency=None):
+    price_minor = parse_price(price, currency) if isinstance(price, str) else price
+    if price_minor is None:
+        print(f"Error saving price history for {product_url}: unparseable price {price!r}")
+        return
+    _price_writer.add(product_url, price_minor, currency, to_epoch(timestamp))
+
+# Function to record that a product was scraped at `timestamp` and its price had not changed
+# (e.g. the fetch cache found the page unchanged). Like a price point at the latest price, it moves
+# the latest interval's last_seen forward and counts in the rollups
+def save_unchanged_price(product_url, timestamp):
+    _price_writer.add(product_url, None, None, to_epoch(timestamp))
+
+# Function to write all queued price points now
+def flush_price_history():
+    _price_writer.flush()
+
+# Function to flush pending writes and close pooled connections, run at interpreter exit
+def close_db():
+    _price_writer.close()
+    _pool.close()
+
+atexit.register(close_db)
 
 # Function to get all products that need to be tracked
 def get_all_tracked_product_urls():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT url FROM tracked_products")
-    urls = [row['url'] for row in cursor.fetchall()]
-    conn.close()
-    return urls
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT url FROM tracked_products")
+        return [row['url'] for row in cursor.fetchall()]
+
+# Function to get the raw price points of a product as (timestamp, price_minor, currency) tuples,
+# optionally limited to [start, end] (epoch seconds). Each stored interval is expanded to a point
+# when the price was first seen and, if it was seen more than once, a point when it was last seen,
+# both clipped to the range.
+def get_product_price_points(product_url, start=None, end=None):
+    start = start if start is not None else 0
+    end = end if end is not None else 2 ** 62
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT ph.price_minor, ph.currency, ph.first_seen, ph.last_seen
+            FROM tracked_products tp
+            JOIN price_history ph ON ph.product_id = tp.id
+            WHERE tp.url = ? AND ph.last_seen >= ? AND ph.first_seen <= ?
+            ORDER BY ph.first_seen ASC
+        ''', (product_url, start, end))
+        rows = cursor.fetchall()
+    points = []
+    for row in rows:
+        # Clip each overlapping interval to the range, so a price that held across the whole range still shows
+        first = max(row['first_seen'], start)
+        last = min(row['last_seen'], end)
+        points.append((first, row['price_minor'], row['currency']))
+        if last != first:
+            points.append((last, row['price_minor'], row['currency']))
+    return points
+
+# Function to turn price points into the JSON-ready history entries served by the API
+def format_price_points(points):
+    return [{'timestamp': format_timestamp(timestamp),
+             'price': format_price(price_minor, currency),
+             'currency': currency} for timestamp, price_minor, currency in points]
 
 # Function to get price history for a specific product URL
-def get_product_price_history(product_url):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT timestamp, price FROM price_history
-        WHERE product_url = ?
-        ORDER BY timestamp ASC
-    ''', (product_url,))
-    history = [{'timestamp': row['timestamp'], 'price': row['price']} for row in cursor.fetchall()]
-    conn.close()
-    return history
+def get_product_price_history(product_url, start=None, end=None):
+    return format_price_points(get_product_price_points(product_url, start, end))
+
+# Function to get precomputed open/high/low/close aggregates of a product per bucket ('1h' or '1d'),
+# optionally limited to buckets starting in [start, end] (epoch seconds)
+def get_product_price_rollup(product_url, bucket, start=None, end=None):
+    table, width = ROLLUP_BUCKETS[bucket]
+    start = start - start % width if start is not None else 0 # include the bucket `start` falls into
+    end = end if end is not None else 2 ** 62
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT r.bucket_start, r.open_minor, r.high_minor, r.low_minor, r.close_minor, r.currency, r.samples
+            FROM tracked_products tp
+            JOIN {table} r ON r.product_id = tp.id
+            WHERE tp.url = ? AND r.bucket_start BETWEEN ? AND ?
+            ORDER BY r.bucket_start ASC
+        ''', (product_url, start, end))
+        rows = cursor.fetchall()
+    # Buckets are UTC hours/days, so their start is given in UTC rather than local time
+    return [{'timestamp': format_utc_timestamp(row['bucket_start']),
+             'open': format_price(row['open_minor'], row['currency']),
+             'high': format_price(row['high_minor'], row['currency']),
+             'low': format_price(row['low_minor'], row['currency']),
+             'close': format_price(row['close_minor'], row['currency']),
+             'price': format_price(row['close_minor'], row['currency']), # same as close, for plain line charts
+             'currency': row['currency'],
+             'samples': row['samples']} for row in rows]
 
 # Function to get details of a tracked product by URL
 def get_tracked_product_details(product_url):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT title, image_url FROM tracked_products WHERE url = ?", (product_url,))
-    row = cursor.fetchone()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT title, image_url FROM tracked_products WHERE url = ?", (product_url,))
+        row = cursor.fetchone()
     if row:
-        return {"title": row["title"], "image_url": row["image_url"]} 
-    return None
\ No newline at end of file
+        return {"title": row["title"], "image_url": row["image_url"]}
+    return None
+
+
+# Function to get the data the adaptive scrape scheduler needs for every tracked product:
+# how often its price changed, over what span of time, its last price (minor units) and when it was last checked
+def get_product_schedule_stats():
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            WITH stats AS (
+                SELECT product_id,
+                       COUNT(*) - 1 AS change_count,
+                       MAX(last_seen) - MIN(first_seen) AS history_span,
+                       MAX(first_seen) AS latest_first_seen
+                FROM price_history
+                GROUP BY product_id
+            )
+            SELECT tp.url,
+                   COALESCE(stats.change_count, 0) AS change_count,
+                   COALESCE(stats.history_span, 0) AS history_span,
+                   (SELECT ph.price_minor FROM price_history ph
+                    WHERE ph.product_id = tp.id AND ph.first_seen = stats.latest_first_seen) AS last_price,
+                   CAST(strftime('%s', tp.last_checked_at) AS INTEGER) AS last_checked_at
+            FROM tracked_products tp
+            LEFT JOIN stats ON stats.product_id = tp.id
+        ''')
+        return [dict(row) for row in cursor.fetchall()]
+
+# Function to record that products were just scraped
+def mark_products_checked(urls):
+    with db_connection() as conn:
+        try:
+            conn.executemany("UPDATE tracked_products SET last_checked_at = CURRENT_TIMESTAMP WHERE url = ?",
+                             [(url,) for url in urls])
+            conn.commit()
+        except Exception as e:
+            print(f"Error updating last_checked_at: {e}")
+
+# Function to load the stored fetch validators (etag, last_modified, content_digest) of the given URLs
+def get_fetch_validators(urls):
+    with db_connection() as conn:
+        rows = _select_in(conn, "SELECT * FROM fetch_cache WHERE url IN ({placeholders})", urls)
+        return {row['url']: dict(row) for row in rows}
+
+# Function to store fetch validators, given as dicts with url, etag, last_modified, content_digest and updated_at
+def save_fetch_validators(validators):
+    if not validators:
+        return
+    with db_connection() as conn:
+        try:
+            conn.executemany('''
+                INSERT INTO fetch_cache (url, etag, last_modified, content_digest, updated_at)
+                VALUES (:url, :etag, :last_modified, :content_digest, :updated_at)
+                ON CONFLICT(url) DO UPDATE SET
+                etag=excluded.etag,
+                last_modified=excluded.last_modified,
+                content_digest=excluded.content_digest,
+                updated_at=excluded.updated_at
+            ''', validators)
+            conn.commit()
+        except Exception as e:
+            print(f"Error saving fetch validators: {e}")
+
+# Function to create scrape jobs (see worker.py) for products that have none yet.
+# `jobs` are dicts with url, due_at, interval and last_price; existing jobs are left untouched
+def add_scrape_jobs(jobs):
+    with db_connection() as conn:
+        try:
+            conn.executemany('''
+                INSERT OR IGNORE INTO scrape_jobs (product_id, due_at, interval, last_price)
+                SELECT id, :due_at, :interval, :last_price FROM tracked_products WHERE url = :url
+            ''', jobs)
+            conn.commit()
+        except Exception as e:
+            print(f"Error adding scrape jobs: {e}")
+
+# Function to create a scrape job for every tracked product without one (e.g. added through /track since),
+# due `interval` seconds after the product was last checked. Returns the number of jobs created
+def add_missing_scrape_jobs(interval, now):
+    with db_connection() as conn:
+        try:
+            cursor = conn.execute('''
+                INSERT INTO scrape_jobs (product_id, due_at, interval)
+                SELECT tp.id, COALESCE(CAST(strftime('%s', tp.last_checked_at) AS INTEGER) + ?, ?), ?
+                FROM tracked_products tp
+                LEFT JOIN scrape_jobs sj ON sj.product_id = tp.id
+                WHERE sj.product_id IS NULL
+            ''', (interval, now, interval))
+            conn.commit()
+            return cursor.rowcount
+        except Exception as e:
+            print(f"Error adding missing scrape jobs: {e}")
+            return 0
+
+# Function to claim up to `limit` due scrape jobs for the worker `owner`, leased until `lease_seconds`
+# from `now`. A job whose lease expired (its worker crashed or hung) is claimable again.
+# Returns the claimed jobs as dicts with product_id, url, interval, last_price and failures
+def claim_scrape_jobs(owner, limit, lease_seconds, now):
+    with db_connection() as conn:
+        try:
+            # One UPDATE both picks and leases the jobs, inside a write transaction taken up front,
+            # so two workers can never claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute('''
+                UPDATE scrape_jobs SET lease_owner = ?, lease_expires_at = ?
+                WHERE product_id IN (
+                    SELECT product_id FROM scrape_jobs
+                    WHERE due_at <= ? AND (lease_expires_at IS NULL OR lease_expires_at <= ?)
+                    ORDER BY due_at
+                    LIMIT ?
+                )
+                RETURNING product_id, interval, last_price, failures
+            ''', (owner, now + lease_seconds, now, now, limit)).fetchall()
+            jobs = [dict(row) for row in rows]
+            rows = _select_in(conn, "SELECT id, url FROM tracked_products WHERE id IN ({placeholders})",
+                              [job['product_id'] for job in jobs])
+            urls = {row['id']: row['url'] for row in rows}
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Error claiming scrape jobs: {e}")
+            return []
+    for job in jobs:
+        job['url'] = urls[job['product_id']]
+    return jobs
+
+# Function to store the new schedule of jobs claimed by `owner` and release their leases.
+# `jobs` are dicts with product_id, due_at, interval, last_price and failures. Jobs whose lease
+# expired and was taken over by another worker are left to that worker. Returns the number released
+def complete_scrape_jobs(owner, jobs):
+    if not jobs:
+        return 0
+    with db_connection() as conn:
+        try:
+            cursor = conn.executemany('''
+                UPDATE scrape_jobs SET
+                due_at = :due_at,
+                interval = :interval,
+                last_price = :last_price,
+                failures = :failures,
+                lease_owner = NULL,
+                lease_expires_at = NULL
+                WHERE product_id = :product_id AND lease_owner = :owner
+            ''', [dict(job, owner=owner) for job in jobs])
+            conn.commit()
+            return cursor.rowcount
+        except Exception as e:
+            print(f"Error completing scrape jobs: {e}")
+            return 0
+
+# Function to record a new bulk tracking job (see bulk_ingest.py) in the 'queued' state
+def create_ingest_job(job_id, total, duplicates, invalid, now):
+    with db_connection() as conn:
+        conn.execute('''
+            INSERT INTO ingest_jobs (id, status, total, duplicates, invalid, created_at, updated_at)
+            VALUES (?, 'queued', ?, ?, ?, ?, ?)
+        ''', (job_id, total, duplicates, invalid, now, now))
+        conn.commit()
+
+# Function to update the status and progress of a bulk tracking job
+def update_ingest_job(job_id, status, scraped, failed, now, error=None):
+    with db_connection() as conn:
+        try:
+            conn.execute('''
+                UPDATE ingest_jobs SET status = ?, scraped = ?, failed = ?, error = ?, updated_at = ?
+                WHERE id = ?
+            ''', (status, scraped, failed, error, now, job_id))
+            conn.commit()
+        except Exception as e:
+            print(f"Error updating ingest job {job_id}: {e}")
+
+# Function to add the new products of a bulk tracking job, given as (url, product_key) pairs, for worker.py
+# processes to scrape: each is tagged with the job and gets a scrape job due `now`. Products tracked since
+# the job was created are counted as duplicates. Returns the number of products added
+def add_tracked_products_for_workers(job_id, products, interval, now):
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE") # rolled back by the pool if anything below fails
+        added = conn.executemany('''
+            INSERT OR IGNORE INTO tracked_products (url, product_key, last_checked_at, ingest_job_id)
+            VALUES (?, ?, NULL, ?)
+        ''', [(url, key, job_id) for url, key in products]).rowcount
+        conn.execute('''
+            INSERT OR IGNORE INTO scrape_jobs (product_id, due_at, interval)
+            SELECT id, ?, ? FROM tracked_products WHERE ingest_job_id = ?
+        ''', (now, interval, job_id))
+        conn.execute('''
+            UPDATE ingest_jobs SET
+            status = 'running',
+            scraped_by_workers = 1,
+            duplicates = duplicates + ?,
+            updated_at = ?
+            WHERE id = ?
+        ''', (len(products) - added, now, job_id))
+        conn.commit()
+        return added
+
+# Function to get a bulk tracking job as a dict, or None if there is no such job.
+# Progress of a job scraped by workers is counted from its products: a checked product was scraped,
+# or failed if its scrape job is backing off; the job is done once all of them were checked
+def get_ingest_job(job_id):
+    with db_connection() as conn:
+        row = conn.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        if job['scraped_by_workers'] and job['status'] == 'running':
+            progress = conn.execute('''
+                SELECT
+                COUNT(*) AS products,
+                COALESCE(SUM(tp.last_checked_at IS NOT NULL AND COALESCE(sj.failures, 0) = 0), 0) AS scraped,
+                COALESCE(SUM(tp.last_checked_at IS NOT NULL AND sj.failures > 0), 0) AS failed
+                FROM tracked_products tp
+                LEFT JOIN scrape_jobs sj ON sj.product_id = tp.id
+                WHERE tp.ingest_job_id = ?
+            ''', (job_id,)).fetchone()
+            job['scraped'], job['failed'] = progress['scraped'], progress['failed']
+            if job['scraped'] + job['failed'] >= progress['products']:
+                job['status'] = 'done'
+    return job
+
+# Function to add an alert rule for a tracked product. `kind` is 'target_price' (with `target_minor`)
+# or 'percent_drop' (with `percent`). The rule's running state starts from the product's latest price.
+# Returns the new rule's id, or None if the product is not tracked
+def create_alert_rule(product_url, kind, currency, now, target_minor=None, percent=None):
+    with db_connection() as conn:
+        row = conn.execute('''
+            SELECT tp.id, ph.price_minor, ph.last_seen
+            FROM tracked_products tp
+            LEFT JOIN price_history ph ON ph.id = (
+                SELECT id FROM price_history WHERE product_id = tp.id ORDER BY first_seen DESC LIMIT 1
+            )
+            WHERE tp.url = ?
+        ''', (product_url,)).fetchone()
+        if row is None:
+            return None
+        cursor = conn.execute('''
+            INSERT INTO alert_rules (product_id, kind, target_minor, percent, currency, created_at,
+                                     last_price, last_seen, min_price, max_price)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (row['id'], kind, target_minor, percent, currency, now,
+              row['price_minor'], row['last_seen'], row['price_minor'], row['price_minor']))
+        conn.commit()
+        return cursor.lastrowid
+
+# Function to get the latest price (minor units) and currency of a product, or None if it has no price yet
+def get_latest_price(product_url):
+    with db_connection() as conn:
+        row = conn.execute('''
+            SELECT ph.price_minor, ph.currency
+            FROM tracked_products tp
+            JOIN price_history ph ON ph.product_id = tp.id
+            WHERE tp.url = ?
+            ORDER BY ph.first_seen DESC LIMIT 1
+        ''', (product_url,)).fetchone()
+    return dict(row) if row else None
+
+# Function to get alert rules with their state as JSON-ready dicts: those of one product if
+# `product_url` is given, otherwise all of them; `rule_id` selects a single rule
+def get_alert_rules(product_url=None, rule_id=None):
+    conditions = []
+    params = []
+    if product_url is not None:
+        conditions.append("tp.url = ?")
+        params.append(product_url)
+    if rule_id is not None:
+        conditions.append("ar.id = ?")
+        params.append(rule_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    with db_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT ar.*, tp.url,
+                   (SELECT COUNT(*) FROM alert_events ae WHERE ae.rule_id = ar.id) AS times_fired
+            FROM alert_rules ar
+            JOIN tracked_products tp ON tp.id = ar.product_id
+            {where}
+            ORDER BY ar.id
+        ''', params).fetchall()
+    rules = []
+    for row in rows:
+        currency = row['currency']
+        threshold = threshold_minor(row)
+        rules.append({
+            'id': row['id'],
+            'url': row['url'],
+            'kind': row['kind'],
+            'target_price': format_price(row['target_minor'], currency) if row['target_minor'] is not None else None,
+            'percent': row['percent'],
+            'currency': currency,
+            'enabled': bool(row['enabled']),
+            'threshold_price': format_price(threshold, currency) if threshold is not None else None,
+            'last_price': format_price(row['last_price'], currency) if row['last_price'] is not None else None,
+            'min_price': format_price(row['min_price'], currency) if row['min_price'] is not None else None,
+            'max_price': format_price(row['max_price'], currency) if row['max_price'] is not None else None,
+            'triggered': bool(row['triggered']),
+            'last_triggered_at': format_timestamp(row['triggered_at']) if row['triggered_at'] else None,
+            'times_fired': row['times_fired'],
+            'created_at': format_timestamp(row['created_at']),
+        })
+    return rules
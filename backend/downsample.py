@@ -0,0 +1,45 @@
+def lttb(points, threshold, x=lambda point: point[0], y=lambda point: point[1]):
+    """
+    Largest-Triangle-Three-Buckets downsampling: reduces `points` (sorted by x) to at most
+    `threshold` points while keeping the visual shape of the series, including spikes.
+    The first and last points are always kept. `x` and `y` pick the coordinates out of a point.
+    """
+    count = len(points)
+    if threshold >= count:
+        return list(points)
+    if threshold <= 0:
+        return []
+    if threshold < 3: # no room for buckets: keep the last point, and the first if there is room
+        return [points[0], points[-1]][-threshold:]
+
+    sampled = [points[0]]
+    bucket_size = (count - 2) / (threshold - 2)
+    previous = 0 # index of the last selected point
+
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # Average of the next bucket is the third corner of the triangle
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, count)
+        if next_start >= next_end: # last bucket: use the final point
+            next_start, next_end = count - 1, count
+        next_points = points[next_start:next_end]
+        average_x = sum(x(point) for point in next_points) / len(next_points)
+        average_y = sum(y(point) for point in next_points) / len(next_points)
+
+        previous_x, previous_y = x(points[previous]), y(points[previous])
+        best_area = -1
+        best = start
+        for index in range(start, end):
+            area = abs((previous_x - average_x) * (y(points[index]) - previous_y)
+                       - (previous_x - x(points[index])) * (average_y - previous_y))
+            if area > best_area:
+                best_area = area
+                best = index
+        sampled.append(points[best])
+        previous = best
+
+    sampled.append(points[-1])
+    return sampled
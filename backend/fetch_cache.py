@@ -0,0 +1,113 @@
+import hashlib
+import threading
+import time
+
+from product_extractor import get_page, parse_product_response, request_headers
+
+# Returned by FetchCache.fetch_product() when the page has not changed since the last scrape
+PAGE_UNCHANGED = 'page-unchanged'
+
+# Product pages embed per-request tokens, ads and recommendations, so the whole body never
+# hashes the same twice. Only the markup that follows these markers feeds the digest.
+REGION_MARKERS = (
+    b'id="productTitle"',
+    b'a-price-whole',
+    b'a-offscreen',
+    b'id="landingImage"',
+    b'id="availability"',
+)
+REGION_SIZE = 2048 # bytes digested after each marker
+
+
+def region_digest(content):
+    """Digest of the page regions PricePulse extracts data from, or None if none of them is present."""
+    digest = hashlib.blake2b(digest_size=16)
+    found = False
+    for marker in REGION_MARKERS:
+        position = content.find(marker)
+        if position != -1:
+            found = True
+            digest.update(content[position:position + REGION_SIZE])
+    return digest.hexdigest() if found else None
+
+
+class FetchCache:
+    """
+    Remembers, per product URL, the HTTP validators (ETag / Last-Modified) and a digest of
+    the relevant page region from the last successful scrape. fetch_product() sends them as
+    conditional request headers and returns PAGE_UNCHANGED on a 304 or when the digest
+    matches, so unchanged pages are neither parsed nor written to price_history.
+
+    Entries are loaded from and saved to the fetch_cache table in bulk by the caller
+    (prime() before a sweep, pop_updates() after it); fetch_product() itself is thread-safe.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._updates = {}
+        self._lock = threading.Lock()
+
+    def missing(self, urls):
+        """URLs whose validators are not loaded yet."""
+        with self._lock:
+            return [url for url in urls if url not in self._entries]
+
+    def prime(self, urls, validators):
+        """Loads stored validators for `urls`, as returned by database.get_fetch_validators()."""
+        with self._lock:
+            for url in urls:
+                self._entries[url] = validators.get(url)
+
+    def pop_updates(self):
+        """Returns the validators changed since the last call, ready for database.save_fetch_validators()."""
+        with self._lock:
+            updates, self._updates = list(self._updates.values()), {}
+        return updates
+
+    def _store(self, url, etag, last_modified, content_digest):
+        entry = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'content_digest': content_digest,
+            'updated_at': int(time.time())
+        }
+        with self._lock:
+            self._entries[url] = entry
+            self._updates[url] = entry
+
+    def fetch_product(self, url, session=None):
+        """Like product_extractor.fetch_product(), but returns PAGE_UNCHANGED for pages that did not change."""
+        headers = request_headers()
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = get_page(url, headers, session)
+            if response.status_code == 304 and entry:
+                return PAGE_UNCHANGED
+            if response.status_code != 200:
+                print(f"Request failed: {response.status_code}")
+                return None
+
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            content_digest = region_digest(response.content)
+            if entry and content_digest and content_digest == entry['content_digest']:
+                if (etag, last_modified) != (entry['etag'], entry['last_modified']):
+                    self._store(url, etag, last_modified, content_digest)
+                return PAGE_UNCHANGED
+
+            product = parse_product_response(url, response)
+            # Only remember pages a price was read from, so a failed parse is retried in full next time
+            if product.price_minor is not None:
+                self._store(url, etag, last_modified, content_digest)
+            return product
+        except Exception as e:
+            print(f"Error fetching data: {e}")
+            return None
@@ -0,0 +1,226 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PARSE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SWEEP_BUCKETS = (1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+# Every metric created in this process, in creation order, for render()
+_registry = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, label_values):
+        if len(label_values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {label_values}")
+        return tuple(str(value) for value in label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by label values: COUNTER.inc('200', amount=1)."""
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {} if labelnames else {(): 0}
+
+    def inc(self, *label_values, amount=1):
+        key = self._key(label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *label_values):
+        with self._lock:
+            return self._values.get(self._key(label_values), 0)
+
+    def _samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    """Value that can also be set directly; used for the figures of the last sweep."""
+    type_name = 'gauge'
+
+    def set(self, value, *label_values):
+        key = self._key(label_values)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values over fixed buckets. An observation is one bisect and
+    a few additions under a lock, so it is cheap enough to wrap every request and parse.
+    """
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {} # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        if not labelnames:
+            self._series[()] = self._new_series()
+
+    def _new_series(self):
+        return [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+    def observe(self, value, *label_values):
+        key = self._key(label_values)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = self._new_series()
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *label_values):
+        """Context manager observing the duration of its block in seconds."""
+        return _Timer(self, label_values)
+
+    def _samples(self):
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        lines = []
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    return '\n'.join(metric.render() for metric in _registry) + '\n'
+
+
+# --- Pipeline metrics ---
+FETCH_SECONDS = Histogram('pricepulse_fetch_seconds', "Time to download a product page.")
+FETCH_RESPONSES = Counter('pricepulse_fetch_responses_total',
+                          "Product page requests by HTTP status code ('error' if no response was received).",
+                          ['status'])
+FETCH_BYTES = Counter('pricepulse_fetch_bytes_total', "Bytes of product page bodies downloaded.")
+PARSE_SECONDS = Histogram('pricepulse_parse_seconds', "Time to parse a product page.", buckets=PARSE_BUCKETS)
+SCRAPE_RESULTS = Counter('pricepulse_scrape_results_total',
+                         "Scheduled scrapes by outcome (saved, unchanged, no_price, failed).", ['outcome'])
+DB_FLUSH_SECONDS = Histogram('pricepulse_db_flush_seconds', "Time to write one batch of price points.")
+DB_FLUSH_ROWS = Counter('pricepulse_db_flush_points_total', "Price points written to price_history.")
+DB_FLUSH_ERRORS = Counter('pricepulse_db_flush_errors_total', "Price point batches that failed to write.")
+API_SECONDS = Histogram('pricepulse_http_request_seconds', "Flask request handling time by endpoint.", ['endpoint'])
+API_REQUESTS = Counter('pricepulse_http_requests_total', "Flask requests by endpoint and status code.",
+                       ['endpoint', 'status'])
+ALERTS_FIRED = Counter('pricepulse_alerts_fired_total', "Price alerts fired by rule kind.", ['kind'])
+ALERT_DELIVERY_ERRORS = Counter('pricepulse_alert_delivery_errors_total', "Alert batches a sink failed to deliver.",
+                                ['sink'])
+SWEEP_SECONDS = Histogram('pricepulse_sweep_seconds', "Duration of scheduled scrape sweeps.", buckets=SWEEP_BUCKETS)
+LAST_SWEEP_PRODUCTS = Gauge('pricepulse_last_sweep_products', "Products scraped by the last sweep.")
+LAST_SWEEP_PRODUCTS_PER_SECOND = Gauge('pricepulse_last_sweep_products_per_second', "Throughput of the last sweep.")
+LAST_SWEEP_FAILURES = Gauge('pricepulse_last_sweep_failures', "Failed scrapes in the last sweep.")
+
+
+class SweepStats:
+    """
+    Per-sweep summary: duration, throughput, outcome counts and the `slowest` URLs.
+    timed() wraps the fetch function handed to the scrape engine; per-URL timings are
+    kept in a bounded min-heap, so a sweep never holds more than `slowest` of them.
+    """
+
+    def __init__(self, slowest=5):
+        self.slowest = slowest
+        self.outcomes = {}
+        self._heap = [] # (seconds, url), smallest first
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def timed(self, fetch):
+        def timed_fetch(url, session=None):
+            start = time.perf_counter()
+            try:
+                return fetch(url, session=session)
+            finally:
+                self._record_time(url, time.perf_counter() - start)
+        return timed_fetch
+
+    def _record_time(self, url, seconds):
+        with self._lock:
+            if len(self._heap) < self.slowest:
+                heapq.heappush(self._heap, (seconds, url))
+            elif seconds > self._heap[0][0]:
+                heapq.heapreplace(self._heap, (seconds, url))
+
+    def record(self, outcome):
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        SCRAPE_RESULTS.inc(outcome)
+
+    def finish(self):
+        """Publishes the sweep to the metrics and returns its summary as a dict."""
+        duration = time.perf_counter() - self._start
+        products = sum(self.outcomes.values())
+        failures = self.outcomes.get('failed', 0) + self.outcomes.get('no_price', 0)
+        with self._lock:
+            slowest = sorted(self._heap, reverse=True)
+        summary = {
+            'duration_seconds': duration,
+            'products': products,
+            'products_per_second': products / duration if duration > 0 else 0.0,
+            'failures': failures,
+            'outcomes': dict(self.outcomes),
+            'slowest': [{'url': url, 'seconds': seconds} for seconds, url in slowest],
+        }
+        SWEEP_SECONDS.observe(duration)
+        LAST_SWEEP_PRODUCTS.set(products)
+        LAST_SWEEP_PRODUCTS_PER_SECOND.set(summary['products_per_second'])
+        LAST_SWEEP_FAILURES.set(failures)
+        return summary
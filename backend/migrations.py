@@ -0,0 +1,298 @@
+"""
+Versioned schema migrations. The current version is stored in `PRAGMA user_version`;
+to change the schema, append a function to MIGRATIONS and never edit one that has shipped.
+"""
+from pricing import currency_for_url, parse_price, to_epoch
+from product_keys import product_key
+from rollups import create_rollup_tables, update_rollups
+
+
+def _create_baseline_schema(conn):
+    """Version 1: the original schema. IF NOT EXISTS keeps it a no-op on databases created before migrations."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tracked_products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT UNIQUE NOT NULL,
+            title TEXT,
+            image_url TEXT,
+            last_checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS price_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_url TEXT NOT NULL,
+            price TEXT,
+            timestamp TEXT NOT NULL,
+            FOREIGN KEY (product_url) REFERENCES tracked_products (url) ON DELETE CASCADE
+        )
+    ''')
+
+
+def _type_price_history(conn):
+    """
+    Version 2: price_history keyed by an integer product_id, with prices as integer
+    minor units plus a currency code and epoch-second timestamps, indexed by
+    (product_id, timestamp). Existing TEXT rows are parsed and copied over; rows
+    whose price can't be parsed (e.g. "Price not found") are dropped.
+    """
+    conn.execute("ALTER TABLE price_history RENAME TO price_history_v1")
+    conn.execute('''
+        CREATE TABLE price_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            price_minor INTEGER NOT NULL,
+            currency TEXT,
+            timestamp INTEGER NOT NULL,
+            FOREIGN KEY (product_id) REFERENCES tracked_products (id) ON DELETE CASCADE
+        )
+    ''')
+
+    # History rows can outlive their tracked product; keep them by re-adding the product
+    conn.execute('''
+        INSERT OR IGNORE INTO tracked_products (url)
+        SELECT DISTINCT product_url FROM price_history_v1
+    ''')
+
+    old_rows = conn.execute('''
+        SELECT tp.id AS product_id, ph.product_url, ph.price, ph.timestamp
+        FROM price_history_v1 ph
+        JOIN tracked_products tp ON tp.url = ph.product_url
+        ORDER BY ph.id
+    ''')
+    new_rows = []
+    for row in old_rows:
+        currency = currency_for_url(row['product_url'])
+        price_minor = parse_price(row['price'], currency)
+        if price_minor is None:
+            continue
+        try:
+            timestamp = to_epoch(row['timestamp'])
+        except ValueError:
+            continue
+        new_rows.append((row['product_id'], price_minor, currency, timestamp))
+    conn.executemany('''
+        INSERT INTO price_history (product_id, price_minor, currency, timestamp)
+        VALUES (?, ?, ?, ?)
+    ''', new_rows)
+
+    conn.execute("DROP TABLE price_history_v1")
+    conn.execute("CREATE INDEX idx_price_history_product_time ON price_history (product_id, timestamp)")
+
+
+def points_to_intervals(points):
+    """
+    Collapses (product_id, price_minor, currency, timestamp) points, ordered by product and
+    time, into (product_id, price_minor, currency, first_seen, last_seen, samples) intervals:
+    one per run of consecutive identical prices.
+    """
+    interval = None
+    for product_id, price_minor, currency, timestamp in points:
+        if interval and interval[0] == product_id and interval[1] == price_minor and interval[2] == currency:
+            interval[4] = timestamp
+            interval[5] += 1
+            continue
+        if interval:
+            yield tuple(interval)
+        interval = [product_id, price_minor, currency, timestamp, timestamp, 1]
+    if interval:
+        yield tuple(interval)
+
+
+def _store_price_changes_only(conn):
+    """
+    Version 3: price_history holds one row per run of an unchanged price, with the
+    first and last time it was seen and how many scrapes saw it, instead of one row
+    per scrape. Existing points are collapsed into intervals.
+    """
+    conn.execute("ALTER TABLE price_history RENAME TO price_history_v2")
+    conn.execute("DROP INDEX IF EXISTS idx_price_history_product_time")
+    conn.execute('''
+        CREATE TABLE price_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            price_minor INTEGER NOT NULL,
+            currency TEXT,
+            first_seen INTEGER NOT NULL,
+            last_seen INTEGER NOT NULL,
+            samples INTEGER NOT NULL DEFAULT 1,
+            FOREIGN KEY (product_id) REFERENCES tracked_products (id) ON DELETE CASCADE
+        )
+    ''')
+    points = conn.execute('''
+        SELECT product_id, price_minor, currency, timestamp FROM price_history_v2
+        ORDER BY product_id, timestamp, id
+    ''')
+    conn.executemany('''
+        INSERT INTO price_history (product_id, price_minor, currency, first_seen, last_seen, samples)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', points_to_intervals(tuple(row) for row in points))
+    conn.execute("DROP TABLE price_history_v2")
+    conn.execute("CREATE INDEX idx_price_history_product_first_seen ON price_history (product_id, first_seen)")
+
+
+def _add_range_queries_and_rollups(conn):
+    """
+    Version 4: hourly and daily price rollup tables (see rollups.py), and an index on
+    (product_id, last_seen) so time-range queries only visit intervals that overlap the range.
+    Rollups are backfilled from the first/last-seen points of the existing intervals.
+    """
+    conn.execute("CREATE INDEX idx_price_history_product_last_seen ON price_history (product_id, last_seen)")
+    create_rollup_tables(conn)
+    points = []
+    for row in conn.execute("SELECT product_id, price_minor, currency, first_seen, last_seen FROM price_history"):
+        points.append((row['product_id'], row['price_minor'], row['currency'], row['first_seen']))
+        if row['last_seen'] != row['first_seen']:
+            points.append((row['product_id'], row['price_minor'], row['currency'], row['last_seen']))
+    update_rollups(conn, points)
+
+
+def _add_fetch_cache(conn):
+    """Version 5: HTTP validators and a digest of the relevant page region per product URL (see fetch_cache.py)."""
+    conn.execute('''
+        CREATE TABLE fetch_cache (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_digest TEXT,
+            updated_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def _add_scrape_jobs(conn):
+    """
+    Version 6: the scrape job queue worked by worker.py. One row per tracked product holds
+    its scheduling state and, while a worker is scraping it, that worker's lease. Rows are
+    created by the workers themselves, which seed intervals from the price history.
+    """
+    conn.execute('''
+        CREATE TABLE scrape_jobs (
+            product_id INTEGER PRIMARY KEY REFERENCES tracked_products (id),
+            due_at INTEGER NOT NULL,
+            interval INTEGER NOT NULL,
+            last_price INTEGER,
+            failures INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires_at INTEGER
+        )
+    ''')
+    conn.execute("CREATE INDEX idx_scrape_jobs_due_at ON scrape_jobs (due_at)")
+
+
+def _add_product_keys_and_ingest_jobs(conn):
+    """
+    Version 7: a product_key (marketplace plus ASIN, see product_keys.py) per tracked product,
+    unique so the same product can't be tracked twice under different URLs, and the ingest_jobs
+    table holding the progress of bulk tracking requests.
+    Existing rows that already duplicate an older row's product keep a NULL key and are left as they are.
+    """
+    conn.execute("ALTER TABLE tracked_products ADD COLUMN product_key TEXT")
+    keys = {}
+    for row in conn.execute("SELECT id, url FROM tracked_products ORDER BY id"):
+        key = product_key(row['url'])
+        if key and key not in keys:
+            keys[key] = row['id']
+    conn.executemany("UPDATE tracked_products SET product_key = ? WHERE id = ?", keys.items())
+    conn.execute("CREATE UNIQUE INDEX idx_tracked_products_product_key ON tracked_products (product_key)")
+    conn.execute('''
+        CREATE TABLE ingest_jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            duplicates INTEGER NOT NULL DEFAULT 0,
+            invalid INTEGER NOT NULL DEFAULT 0,
+            scraped INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def _add_price_alerts(conn):
+    """
+    Version 8: price alert rules with their running evaluation state (see alerts.py),
+    indexed by product so a batch of price points only loads the rules of its products,
+    and the log of fired alerts.
+    """
+    conn.execute('''
+        CREATE TABLE alert_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL REFERENCES tracked_products (id),
+            kind TEXT NOT NULL,
+            target_minor INTEGER,
+            percent REAL,
+            currency TEXT,
+            enabled INTEGER NOT NULL DEFAULT 1,
+            created_at INTEGER NOT NULL,
+            last_price INTEGER,
+            last_seen INTEGER,
+            min_price INTEGER,
+            max_price INTEGER,
+            triggered INTEGER NOT NULL DEFAULT 0,
+            triggered_at INTEGER
+        )
+    ''')
+    conn.execute("CREATE INDEX idx_alert_rules_product_id ON alert_rules (product_id)")
+    conn.execute('''
+        CREATE TABLE alert_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            rule_id INTEGER NOT NULL REFERENCES alert_rules (id),
+            product_id INTEGER NOT NULL,
+            price_minor INTEGER NOT NULL,
+            currency TEXT,
+            threshold_minor INTEGER NOT NULL,
+            timestamp INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX idx_alert_events_rule_id ON alert_events (rule_id)")
+
+
+def _add_ingest_job_products(conn):
+    """
+    Version 9: bulk tracking jobs whose products are scraped by worker.py processes. Such a job
+    only adds its products (tagged with the job's id) and their scrape jobs; its progress is
+    counted from the products' last_checked_at and scrape job failures.
+    """
+    conn.execute("ALTER TABLE tracked_products ADD COLUMN ingest_job_id TEXT")
+    conn.execute("CREATE INDEX idx_tracked_products_ingest_job_id ON tracked_products (ingest_job_id)")
+    conn.execute("ALTER TABLE ingest_jobs ADD COLUMN scraped_by_workers INTEGER NOT NULL DEFAULT 0")
+
+
+MIGRATIONS = [
+    _create_baseline_schema,
+    _type_price_history,
+    _store_price_changes_only,
+    _add_range_queries_and_rollups,
+    _add_fetch_cache,
+    _add_scrape_jobs,
+    _add_product_keys_and_ingest_jobs,
+    _add_price_alerts,
+    _add_ingest_job_products,
+]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Brings the database up to the latest schema version. Returns the number of migrations applied."""
+    applied = 0
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        if schema_version(conn) >= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE") # Also keeps a second process from running the same migration
+        try:
+            if schema_version(conn) < version:
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                applied += 1
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
@@ -0,0 +1,102 @@
+import re
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+# Currency symbols shown next to Amazon prices, mapped to ISO 4217 codes
+CURRENCY_SYMBOLS = {
+    '₹': 'INR',
+    '$': 'USD',
+    '£': 'GBP',
+    '€': 'EUR',
+    '¥': 'JPY',
+}
+
+# Currency of each Amazon marketplace, used when the page shows no symbol
+MARKETPLACE_CURRENCIES = {
+    'amazon.in': 'INR',
+    'amazon.com': 'USD',
+    'amazon.ca': 'CAD',
+    'amazon.co.uk': 'GBP',
+    'amazon.de': 'EUR',
+    'amazon.fr': 'EUR',
+    'amazon.it': 'EUR',
+    'amazon.es': 'EUR',
+    'amazon.co.jp': 'JPY',
+}
+
+# Digits after the decimal point for each currency; anything not listed uses 2
+MINOR_UNIT_DIGITS = {
+    'JPY': 0,
+}
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+UTC_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+_NUMBER_PATTERN = re.compile(r'\d[\d.,\s]*')
+
+
+def minor_unit_digits(currency):
+    return MINOR_UNIT_DIGITS.get(currency, 2)
+
+
+def currency_from_text(text):
+    for symbol, code in CURRENCY_SYMBOLS.items():
+        if symbol in text:
+            return code
+    return None
+
+
+def currency_for_url(url):
+    host = urlsplit(url).netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    return MARKETPLACE_CURRENCIES.get(host)
+
+
+def parse_price(text, currency=None):
+    """
+    Converts a scraped price such as "1,299.", "$19.99" or "1.299,00 €" to integer minor units
+    (paise, cents, ...). Returns None if the text holds no number.
+    """
+    if text is None:
+        return None
+    match = _NUMBER_PATTERN.search(text)
+    if not match:
+        return None
+    number = re.sub(r'\s', '', match.group())
+
+    # The right-most separator is the decimal point if at most two digits follow it
+    # ("19.99", "1,299." , "1.299,00"); otherwise every separator groups thousands ("11,999").
+    whole, fraction = number, ''
+    position = max(number.rfind('.'), number.rfind(','))
+    if position != -1 and len(number) - position - 1 <= 2:
+        whole, fraction = number[:position], number[position + 1:]
+    whole = re.sub(r'[.,]', '', whole) or '0'
+
+    digits = minor_unit_digits(currency)
+    fraction = (fraction + '0' * digits)[:digits]
+    return int(whole) * (10 ** digits) + int(fraction or '0')
+
+
+def format_price(minor_units, currency=None):
+    """Formats minor units back to a plain decimal string, e.g. 129900 -> "1299.00"."""
+    digits = minor_unit_digits(currency)
+    if digits == 0:
+        return str(minor_units)
+    return f"{minor_units / (10 ** digits):.{digits}f}"
+
+
+def to_epoch(timestamp):
+    """Converts a local "YYYY-MM-DD HH:MM:SS" timestamp (as produced by the scrapers) or a number to epoch seconds."""
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp)
+    return int(datetime.strptime(timestamp, TIMESTAMP_FORMAT).timestamp())
+
+
+def format_timestamp(epoch):
+    return datetime.fromtimestamp(epoch).strftime(TIMESTAMP_FORMAT)
+
+
+def format_utc_timestamp(epoch):
+    """ISO 8601 UTC timestamp, e.g. "2025-05-23T00:00:00Z"; used where times are UTC-aligned (rollup buckets)."""
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime(UTC_TIMESTAMP_FORMAT)
@@ -0,0 +1,168 @@
+import codecs
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import lxml.html
+import requests
+from fake_useragent import UserAgent
+
+from metrics import FETCH_BYTES, FETCH_RESPONSES, FETCH_SECONDS, PARSE_SECONDS
+from pricing import currency_for_url, currency_from_text, parse_price
+
+# Generate a random user-agent to mimic browser
+ua = UserAgent()
+
+# XPath helpers; Amazon elements usually carry several classes, so match on a whole class token
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+TITLE_XPATH = '//*[@id="productTitle"]'
+PRICE_WHOLE_XPATH = f'//span[{_has_class("a-price-whole")}]'
+PRICE_OFFSCREEN_XPATH = f'//span[{_has_class("a-offscreen")}]'
+PRICE_SYMBOL_XPATH = f'ancestor::span[{_has_class("a-price")}][1]//span[{_has_class("a-price-symbol")}]'
+PRICE_FRACTION_XPATH = f'ancestor::span[{_has_class("a-price")}][1]//span[{_has_class("a-price-fraction")}]'
+IMAGE_XPATH = '//img[@id="landingImage"]/@src'
+AVAILABILITY_XPATH = '//*[@id="availability"]'
+
+# charset=... in a Content-Type header or a <meta> tag
+_CHARSET_PATTERN = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+
+@dataclass
+class ProductData:
+    """Everything PricePulse reads from one product page. Missing fields are None."""
+    title: Optional[str]
+    price: Optional[str]         # price text as shown on the page, e.g. "1,299.00"
+    price_minor: Optional[int]   # the same price in minor units, e.g. 129900
+    currency: Optional[str]      # ISO 4217 code, e.g. "INR"
+    image_url: Optional[str]
+    availability: Optional[str]  # e.g. "In stock"
+    timestamp: str
+
+
+def _text(element):
+    return ' '.join(element.text_content().split())
+
+
+def _first(tree, xpath):
+    matches = tree.xpath(xpath)
+    return matches[0] if matches else None
+
+
+def _known_encoding(name):
+    try:
+        codecs.lookup(name)
+        return True
+    except LookupError:
+        return False
+
+
+def page_encoding(content, content_type=None):
+    """
+    Encoding of a downloaded page: the charset of its Content-Type header if it names one, else None
+    when the page declares its own in a <meta> tag (lxml reads that), else UTF-8.
+    """
+    match = _CHARSET_PATTERN.search(content_type or '')
+    if match and _known_encoding(match.group(1)):
+        return match.group(1)
+    match = _CHARSET_PATTERN.search(content[:4096].decode('ascii', 'ignore'))
+    if match and _known_encoding(match.group(1)):
+        return None
+    return 'utf-8'
+
+
+def parse_product_page(html, content_type=None):
+    """
+    Extracts title, price, currency, image and availability from a product page in one pass.
+    Uses lxml, which parses the page in C instead of building a Python object tree.
+    `html` is the page as downloaded (bytes, decoded as described in page_encoding()) or as text.
+    """
+    encoding = page_encoding(html, content_type) if isinstance(html, bytes) else None
+    # Parsers are cheap to create and must not be shared between scrape threads
+    parser = lxml.html.HTMLParser(encoding=encoding)
+    tree = lxml.html.fromstring(html, parser=parser)
+
+    title = _first(tree, TITLE_XPATH)
+    title = _text(title) if title is not None else None
+
+    price = None
+    currency = None
+    price_element = _first(tree, PRICE_WHOLE_XPATH)
+    if price_element is not None:
+        price = _text(price_element)
+        fraction = _first(price_element, PRICE_FRACTION_XPATH)
+        if fraction is not None:
+            price += _text(fraction)
+        symbol = _first(price_element, PRICE_SYMBOL_XPATH)
+        if symbol is not None:
+            currency = currency_from_text(_text(symbol))
+    else:
+        price_element = _first(tree, PRICE_OFFSCREEN_XPATH)
+        if price_element is not None:
+            price = _text(price_element)
+            currency = currency_from_text(price)
+
+    image_url = _first(tree, IMAGE_XPATH)
+
+    availability = _first(tree, AVAILABILITY_XPATH)
+    availability = _text(availability) if availability is not None else None
+
+    return ProductData(
+        title=title or None,
+        price=price or None,
+        price_minor=parse_price(price, currency),
+        currency=currency,
+        image_url=str(image_url) if image_url else None,
+        availability=availability or None,
+        timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    )
+
+
+def request_headers():
+    return {
+        "User-Agent": ua.random,
+        "Accept-Language": "en-US,en;q=0.9"
+    }
+
+
+def get_page(url, headers, session=None):
+    """GETs a product page, recording its latency, status code and size in the fetch metrics."""
+    # Reuse the caller's pooled session when one is given (see scrape_engine.py)
+    http = session or requests
+    start = time.perf_counter()
+    try:
+        response = http.get(url, headers=headers, timeout=10)
+    except Exception:
+        FETCH_RESPONSES.inc('error')
+        raise
+    finally:
+        FETCH_SECONDS.observe(time.perf_counter() - start)
+    FETCH_RESPONSES.inc(response.status_code)
+    FETCH_BYTES.inc(amount=len(response.content))
+    return response
+
+
+def parse_product_response(url, response):
+    """Parses a downloaded product page, falling back to the marketplace currency when the page shows none."""
+    with PARSE_SECONDS.time():
+        product = parse_product_page(response.content, response.headers.get('Content-Type'))
+    if product.currency is None:
+        product.currency = currency_for_url(url)
+        product.price_minor = parse_price(product.price, product.currency)
+    return product
+
+
+def fetch_product(url, session=None):
+    """Downloads a product page once and parses it. Returns a ProductData, or None if the request failed."""
+    try:
+        response = get_page(url, request_headers(), session)
+        if response.status_code != 200:
+            print(f"Request failed: {response.status_code}")
+            return None
+        return parse_product_response(url, response)
+    except Exception as e:
+        print(f"Error fetching data: {e}")
+        return None
@@ -0,0 +1,51 @@
+import re
+from urllib.parse import urlsplit
+
+# Path forms Amazon uses for a product page; the ASIN is the 10-character id after them.
+# Titles before /dp/ (e.g. /Some-Product-Name/dp/B0ABCDEFGH) and trailing /ref=... parts are ignored.
+_ASIN_PATTERN = re.compile(
+    r'/(?:dp|gp/product|gp/aw/d|gp/offer-listing|exec/obidos/ASIN|o/ASIN)/([A-Z0-9]{10})(?=[/?#]|$)',
+    re.IGNORECASE
+)
+# Host prefixes that serve the same marketplace as www.
+_HOST_PREFIXES = ('www.', 'smile.', 'm.')
+
+
+def parse_product_url(url):
+    """Returns (marketplace, ASIN) for a product page URL, e.g. ('amazon.in', 'B0ABCDEFGH'), or None."""
+    try:
+        parts = urlsplit(url.strip())
+    except (AttributeError, ValueError):
+        return None
+    if parts.scheme not in ('http', 'https') or not parts.netloc:
+        return None
+    match = _ASIN_PATTERN.search(parts.path)
+    if not match:
+        return None
+    host = parts.netloc.lower()
+    if 'amazon.' in host:
+        for prefix in _HOST_PREFIXES:
+            if host.startswith(prefix):
+                host = host[len(prefix):]
+                break
+    return host, match.group(1).upper()
+
+
+def product_key(url):
+    """
+    Identity of the product a URL points to, e.g. 'amazon.in:B0ABCDEFGH', or None if the URL is
+    not a product page. URLs differing only in titles, tracking or query strings share a key.
+    """
+    parsed = parse_product_url(url)
+    return f"{parsed[0]}:{parsed[1]}" if parsed else None
+
+
+def canonical_url(url):
+    """Shortest URL for the product a URL points to, e.g. 'https://www.amazon.in/dp/B0ABCDEFGH', or None."""
+    parsed = parse_product_url(url)
+    if not parsed:
+        return None
+    marketplace, asin = parsed
+    if marketplace.startswith('amazon.'):
+        return f"https://www.{marketplace}/dp/{asin}"
+    return f"{urlsplit(url.strip()).scheme}://{marketplace}/dp/{asin}"
@@ -0,0 +1,117 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1024
+# Upper bound on how long an entry is served without re-reading the database. Writes made by
+# this process invalidate entries immediately; the TTL covers writes made by other processes.
+DEFAULT_TTL = 300
+
+
+class CachedResponse:
+    def __init__(self, body, etag, last_modified, expires_at):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    def is_fresh(self):
+        return time.time() < self.expires_at
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of serialized API responses, grouped by product URL so
+    every cached variant of a product (different query arguments) can be dropped
+    at once when the product's data is written.
+
+    ETags are a digest of the body, so they stay valid across restarts and processes;
+    Last-Modified is when this cache first saw the current body of an entry.
+
+    Aliases map other URLs of a product (e.g. with tracking parameters) to the URL its
+    entries are stored under, so requests for them are served without resolving the URL again.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict() # (product_url, variant) -> CachedResponse
+        self._keys_by_product = {}
+        self._generations = {} # product_url -> number of invalidations, see generation()
+        self._aliases = OrderedDict() # requested URL -> product_url, least recently added first
+        self._lock = threading.Lock()
+
+    def resolve(self, url):
+        """The product URL responses for `url` are cached under: its alias if it has one, else `url` itself."""
+        with self._lock:
+            return self._aliases.get(url, url)
+
+    def add_alias(self, url, product_url):
+        """Serves requests for `url` from `product_url`'s entries until that product is invalidated."""
+        if url == product_url:
+            return
+        with self._lock:
+            self._aliases[url] = product_url
+            self._aliases.move_to_end(url)
+            while len(self._aliases) > self.max_entries:
+                self._aliases.popitem(last=False)
+
+    def get(self, product_url, variant):
+        """Returns the cached response, or None. Check is_fresh() before serving it."""
+        key = (product_url, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def generation(self, product_url):
+        """
+        Read before querying the database and pass to put(): if the product is invalidated
+        while its response is being built, the (possibly stale) result is not cached.
+        """
+        with self._lock:
+            return self._generations.get(product_url, 0)
+
+    def put(self, product_url, variant, body, generation=None):
+        """
+        Stores a freshly serialized body and returns its CachedResponse. If it replaces an
+        expired entry with the same body, that entry's Last-Modified is kept.
+        """
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        now = time.time()
+        key = (product_url, variant)
+        with self._lock:
+            previous = self._entries.get(key)
+            last_modified = previous.last_modified if previous is not None and previous.etag == etag else now
+            entry = CachedResponse(body, etag, last_modified, now + self.ttl)
+            if generation is not None and generation != self._generations.get(product_url, 0):
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._keys_by_product.setdefault(product_url, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+        return entry
+
+    def invalidate(self, product_url):
+        """Drops every cached response and alias for a product."""
+        with self._lock:
+            self._generations[product_url] = self._generations.get(product_url, 0) + 1
+            for key in self._keys_by_product.pop(product_url, ()):
+                self._entries.pop(key, None)
+            for url in [url for url, target in self._aliases.items() if target == product_url]:
+                del self._aliases[url]
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        keys = self._keys_by_product.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_product[key[0]]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,59 @@
+# Precomputed per-bucket price aggregates, so long /api/history ranges don't have to
+# expand every stored interval. Buckets are aligned to UTC epoch hours/days (a '1d' bucket
+# is a UTC day, whatever the server's or the user's time zone) and aggregate the scraped
+# price points that fell into them (open/high/low/close). Their start times are
+# therefore reported in UTC, see get_product_price_rollup().
+
+# bucket name -> (table, bucket width in seconds)
+ROLLUP_BUCKETS = {
+    '1h': ('price_rollup_hourly', 60 * 60),
+    '1d': ('price_rollup_daily', 24 * 60 * 60),
+}
+
+CREATE_ROLLUP_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        product_id INTEGER NOT NULL,
+        bucket_start INTEGER NOT NULL,
+        open_minor INTEGER NOT NULL,
+        high_minor INTEGER NOT NULL,
+        low_minor INTEGER NOT NULL,
+        close_minor INTEGER NOT NULL,
+        currency TEXT,
+        open_time INTEGER NOT NULL,
+        close_time INTEGER NOT NULL,
+        samples INTEGER NOT NULL,
+        PRIMARY KEY (product_id, bucket_start),
+        FOREIGN KEY (product_id) REFERENCES tracked_products (id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+'''
+
+# In an upsert's SET clause bare column names are the stored row, `excluded` the new point
+UPSERT_ROLLUP = '''
+    INSERT INTO {table} (product_id, bucket_start, open_minor, high_minor, low_minor, close_minor,
+                         currency, open_time, close_time, samples)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+    ON CONFLICT (product_id, bucket_start) DO UPDATE SET
+        open_minor = CASE WHEN excluded.open_time < open_time THEN excluded.open_minor ELSE open_minor END,
+        open_time = MIN(open_time, excluded.open_time),
+        close_minor = CASE WHEN excluded.close_time >= close_time THEN excluded.close_minor ELSE close_minor END,
+        currency = CASE WHEN excluded.close_time >= close_time THEN excluded.currency ELSE currency END,
+        close_time = MAX(close_time, excluded.close_time),
+        high_minor = MAX(high_minor, excluded.high_minor),
+        low_minor = MIN(low_minor, excluded.low_minor),
+        samples = samples + 1
+'''
+
+
+def create_rollup_tables(conn):
+    for table, _ in ROLLUP_BUCKETS.values():
+        conn.execute(CREATE_ROLLUP_TABLE.format(table=table))
+
+
+def update_rollups(conn, points):
+    """Folds (product_id, price_minor, currency, timestamp) points into every rollup table."""
+    for table, width in ROLLUP_BUCKETS.values():
+        conn.executemany(UPSERT_ROLLUP.format(table=table), [
+            (product_id, timestamp - timestamp % width, price_minor, price_minor, price_minor, price_minor,
+             currency, timestamp, timestamp)
+            for product_id, price_minor, currency, timestamp in points
+        ])
@@ -0,0 +1,100 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Defaults used when the app config does not override them
+DEFAULT_MAX_WORKERS = 16     # global number of requests in flight
+DEFAULT_PER_HOST_LIMIT = 4   # requests in flight against a single host
+DEFAULT_MIN_DELAY = 0.1      # seconds between two requests to the same host
+DEFAULT_JITTER = 0.1         # extra random delay (0..jitter seconds) per request
+
+
+def make_session(pool_size):
+    """Builds a requests.Session whose connection pool can serve `pool_size` threads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests to each host by `min_delay` plus a random jitter.
+    Callers reserve the next free slot for the host under a lock and then sleep
+    outside of it, so waiting on one host never blocks requests to another.
+    """
+
+    def __init__(self, min_delay=DEFAULT_MIN_DELAY, jitter=DEFAULT_JITTER):
+        self.min_delay = min_delay
+        self.jitter = jitter
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_delay + random.uniform(0, self.jitter)
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ScrapeEngine:
+    """
+    Runs a fetch function over many URLs with a bounded worker pool.
+    All workers share one pooled HTTP session; concurrency is capped globally
+    (`max_workers`) and per host (`per_host_limit`), and requests to the same
+    host are rate limited with jitter.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, per_host_limit=DEFAULT_PER_HOST_LIMIT,
+                 min_delay=DEFAULT_MIN_DELAY, jitter=DEFAULT_JITTER):
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.session = make_session(max_workers)
+        self.rate_limiter = HostRateLimiter(min_delay, jitter)
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+
+    def _host_semaphore(self, host):
+        with self._host_slots_lock:
+            semaphore = self._host_slots.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_slots[host] = semaphore
+            return semaphore
+
+    def _run_one(self, fetch, url):
+        host = urlsplit(url).netloc.lower()
+        with self._host_semaphore(host):
+            self.rate_limiter.wait(host)
+            try:
+                return fetch(url, session=self.session)
+            except Exception as e:
+                # fetch functions are expected to handle their own errors; this is a safety net
+                print(f"Unhandled error fetching {url}: {e}")
+                return None
+
+    def fetch_all(self, urls, fetch):
+        """
+        Calls `fetch(url, session=...)` for every URL and yields `(url, result)`
+        pairs as they complete. Results are yielded on the caller's thread, so
+        it is safe to write them to the database from the loop body.
+        """
+        urls = list(urls)
+        if not urls:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as executor:
+            futures = {executor.submit(self._run_one, fetch, url): url for url in urls}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,136 @@
+import heapq
+import threading
+import time
+
+# Bounds for how often a single product is scraped (seconds)
+DEFAULT_MIN_INTERVAL = 5 * 60
+DEFAULT_MAX_INTERVAL = 24 * 60 * 60
+# Interval for products with no usable price history yet
+DEFAULT_INITIAL_INTERVAL = 30 * 60
+
+# Aim to scrape a product this many times between two expected price changes
+SAMPLES_PER_CHANGE = 4
+# Multipliers applied to a product's interval after each successful scrape
+SPEEDUP_ON_CHANGE = 0.5
+SLOWDOWN_ON_STABLE = 1.25
+
+
+class ProductSchedule:
+    """Scheduling state for one tracked product."""
+
+    def __init__(self, url, interval, due_at, last_price=None):
+        self.url = url
+        self.interval = interval
+        self.due_at = due_at
+        self.last_price = last_price
+        self.failures = 0
+
+
+class AdaptiveScheduler:
+    """
+    Priority queue of tracked products keyed by the time they are next due.
+
+    Each product has its own interval, seeded from how often its price changed in
+    `price_history` and then adjusted after every scrape: a changed price halves the
+    interval, an unchanged one stretches it, always within [min_interval, max_interval].
+    Failed scrapes are retried with exponential backoff without touching the interval.
+    The queue is shared between the scheduler job and /track, so access is locked.
+    """
+
+    def __init__(self, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL,
+                 initial_interval=DEFAULT_INITIAL_INTERVAL):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial_interval = self._clamp(initial_interval)
+        self._products = {}
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def _clamp(self, interval):
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def _push(self, schedule):
+        # Entries are never removed from the heap; stale ones are skipped in pop_due()
+        heapq.heappush(self._heap, (schedule.due_at, schedule.url))
+
+    def interval_from_history(self, change_count, history_span):
+        """Initial interval for a product whose price changed `change_count` times over `history_span` seconds."""
+        if not history_span or history_span <= 0:
+            return self.initial_interval
+        mean_gap = history_span / (change_count + 1)
+        return self._clamp(mean_gap / SAMPLES_PER_CHANGE)
+
+    def load(self, product_stats, now=None):
+        """Seeds the queue from database.get_product_schedule_stats() rows."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            for stats in product_stats:
+                interval = self.interval_from_history(stats['change_count'], stats['history_span'])
+                last_checked = stats['last_checked_at']
+                # Products never checked, or overdue since before a restart, are due right away
+                due_at = last_checked + interval if last_checked else now
+                schedule = ProductSchedule(stats['url'], interval, due_at, stats['last_price'])
+                self._products[schedule.url] = schedule
+                self._push(schedule)
+
+    def pop_due(self, now=None, limit=None):
+        """Removes and returns the URLs of all products that are due. They are re-queued by record_success/record_failure."""
+        now = now if now is not None else time.time()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and (limit is None or len(due) < limit):
+                due_at, url = heapq.heappop(self._heap)
+                schedule = self._products.get(url)
+                if schedule is None or schedule.due_at != due_at:
+                    continue
+                schedule.due_at = None  # in flight
+                due.append(url)
+        return due
+
+    def reschedule(self, schedule, outcome, price=None, now=None):
+        """
+        Applies the outcome of one scrape ('success', 'unchanged' or 'failure') to a ProductSchedule
+        and sets its next due time. This is the whole interval policy; it is shared with worker.py,
+        which keeps its ProductSchedules in the scrape_jobs table instead of this queue.
+        """
+        now = now if now is not None else time.time()
+        if outcome == 'failure':
+            schedule.failures += 1
+            backoff = self.min_interval * (2 ** (schedule.failures - 1))
+            schedule.due_at = now + min(self.max_interval, backoff)
+            return schedule
+        if outcome == 'unchanged':
+            price = schedule.last_price
+        if schedule.last_price is not None:
+            factor = SPEEDUP_ON_CHANGE if price != schedule.last_price else SLOWDOWN_ON_STABLE
+            schedule.interval = self._clamp(schedule.interval * factor)
+        schedule.last_price = price
+        schedule.failures = 0
+        schedule.due_at = now + schedule.interval
+        return schedule
+
+    def record(self, url, outcome, price=None, now=None):
+        """Re-queues a product after a scrape with the given outcome (see reschedule())."""
+        with self._lock:
+            schedule = self._products.get(url)
+            if schedule is None:
+                schedule = ProductSchedule(url, self.initial_interval, None)
+                self._products[url] = schedule
+            self.reschedule(schedule, outcome, price, now)
+            self._push(schedule)
+
+    def record_success(self, url, price, now=None):
+        """Re-queues a product after a successful scrape, adapting its interval to whether the price moved."""
+        self.record(url, 'success', price, now)
+
+    def record_unchanged(self, url, now=None):
+        """Re-queues a product whose page did not change since its last scrape (same price as before)."""
+        self.record(url, 'unchanged', now=now)
+
+    def record_failure(self, url, now=None):
+        """Re-queues a product after a failed scrape with exponential backoff, capped at max_interval."""
+        self.record(url, 'failure', now=now)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._products)
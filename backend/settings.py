@@ -0,0 +1,34 @@
+"""
+Settings shared by the web app (app.py, loaded into app.config) and the scrape workers (worker.py),
+each overridable via the environment variable of the same name.
+"""
+import os
+
+# Set SCRAPE_SCHEDULER_ENABLED=0 to run the app without the periodic scrape job, e.g. under gunicorn
+# with scraping done by worker.py processes (every web worker would otherwise scrape everything)
+SCRAPE_SCHEDULER_ENABLED = os.environ.get('SCRAPE_SCHEDULER_ENABLED', '1') == '1'
+# Scrape engine limits (see scrape_engine.py); with worker.py they apply per worker process
+SCRAPE_MAX_WORKERS = int(os.environ.get('SCRAPE_MAX_WORKERS', 16))
+SCRAPE_PER_HOST_LIMIT = int(os.environ.get('SCRAPE_PER_HOST_LIMIT', 4))
+SCRAPE_MIN_DELAY = float(os.environ.get('SCRAPE_MIN_DELAY', 0.1))
+SCRAPE_JITTER = float(os.environ.get('SCRAPE_JITTER', 0.1))
+# Adaptive per-product scheduling (see scrape_scheduler.py), all in seconds
+SCRAPE_TICK_SECONDS = int(os.environ.get('SCRAPE_TICK_SECONDS', 30))
+SCRAPE_MIN_INTERVAL = int(os.environ.get('SCRAPE_MIN_INTERVAL', 5 * 60))
+SCRAPE_MAX_INTERVAL = int(os.environ.get('SCRAPE_MAX_INTERVAL', 24 * 60 * 60))
+# Scrape job queue (see worker.py): jobs claimed at a time, and how long they stay leased.
+# The lease must comfortably exceed the time a batch takes, or its jobs are claimed again while still being scraped
+SCRAPE_BATCH_SIZE = int(os.environ.get('SCRAPE_BATCH_SIZE', 100))
+SCRAPE_LEASE_SECONDS = int(os.environ.get('SCRAPE_LEASE_SECONDS', 600))
+# /api/history response cache (see response_cache.py)
+HISTORY_CACHE_SIZE = int(os.environ.get('HISTORY_CACHE_SIZE', 1024))
+HISTORY_CACHE_TTL = int(os.environ.get('HISTORY_CACHE_TTL', 300))
+# Number of slowest product URLs reported in each sweep summary
+SWEEP_SLOWEST_URLS = int(os.environ.get('SWEEP_SLOWEST_URLS', 5))
+# /api/track/bulk (see bulk_ingest.py)
+BULK_TRACK_MAX_URLS = int(os.environ.get('BULK_TRACK_MAX_URLS', 10000))
+BULK_TRACK_CHUNK_SIZE = int(os.environ.get('BULK_TRACK_CHUNK_SIZE', 200))
+# Price alert delivery (see alerts.py): to the log, and to a JSON-lines file if a path is set
+ALERT_LOG_ENABLED = os.environ.get('ALERT_LOG_ENABLED', '1') == '1'
+ALERT_JSONL_PATH = os.environ.get('ALERT_JSONL_PATH')
+ALERT_FLUSH_INTERVAL = float(os.environ.get('ALERT_FLUSH_INTERVAL', 1.0))
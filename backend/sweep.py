@@ -0,0 +1,70 @@
+import logging
+import time
+
+from database import (
+    flush_price_history,
+    get_fetch_validators,
+    mark_products_checked,
+    save_fetch_validators,
+    save_price_history,
+    save_unchanged_price
+)
+from fetch_cache import PAGE_UNCHANGED
+from metrics import SweepStats
+
+# How each sweep outcome feeds the scheduler's interval policy (AdaptiveScheduler.reschedule)
+SCHEDULE_OUTCOMES = {
+    'saved': 'success',
+    'unchanged': 'unchanged',
+    'no_price': 'failure',
+    'failed': 'failure',
+}
+
+
+def run_sweep(urls, engine, fetch_cache, on_result, slowest=5):
+    """
+    Scrapes `urls` concurrently through `engine`, skipping pages `fetch_cache` reports as unchanged,
+    and calls `on_result(url, outcome, product)` for each URL as its result arrives, with outcome
+    one of SCHEDULE_OUTCOMES and product the scraped ProductData (None if unchanged or failed).
+    Price points (unchanged pages extend the latest price), fetch validators and last_checked_at
+    are written before returning the sweep summary (see metrics.SweepStats).
+
+    Used by the in-process scheduler job in app.py and by worker.py.
+    """
+    logging.info(f"Starting scrape sweep for {len(urls)} due products...")
+    sweep = SweepStats(slowest=slowest)
+    urls_without_validators = fetch_cache.missing(urls)
+    if urls_without_validators:
+        fetch_cache.prime(urls_without_validators, get_fetch_validators(urls_without_validators))
+
+    # Results arrive on this thread as they complete, so DB writes stay single-threaded
+    for url, product in engine.fetch_all(urls, sweep.timed(fetch_cache.fetch_product)):
+        if product is PAGE_UNCHANGED:
+            save_unchanged_price(url, int(time.time()))
+            outcome, scraped = 'unchanged', None
+        elif product and product.price_minor is not None:
+            save_price_history(url, product.price_minor, product.timestamp, product.currency)
+            outcome, scraped = 'saved', product
+            # Optionally update the title/image in tracked_products if they change
+            # For now, we only update them when user manually adds/tracks via UI
+            # add_or_update_tracked_product(url, product.title, product.image_url) # If you want to auto-update image too
+            logging.info(f"Successfully scraped and saved price for: {product.title}")
+        elif product:
+            outcome, scraped = 'no_price', product
+            logging.warning(f"Price not found for {url}. Title: {product.title}")
+        else:
+            outcome, scraped = 'failed', None
+            logging.warning(f"Failed to fetch data for: {url}")
+        sweep.record(outcome)
+        on_result(url, outcome, scraped)
+    flush_price_history() # Write this sweep's price points in one transaction
+    save_fetch_validators(fetch_cache.pop_updates())
+    mark_products_checked(urls)
+
+    summary = sweep.finish()
+    slowest_urls = ', '.join(f"{entry['url']} ({entry['seconds']:.2f}s)" for entry in summary['slowest'])
+    logging.info(f"Scrape sweep finished: {summary['products']} products in "
+                 f"{summary['duration_seconds']:.2f}s ({summary['products_per_second']:.1f}/s), "
+                 f"{summary['outcomes'].get('unchanged', 0)} unchanged pages skipped, "
+                 f"{summary['failures']} failures. Slowest: {slowest_urls or 'n/a'}")
+    return summary
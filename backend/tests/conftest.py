@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Points the database module at a fresh, migrated database file for one test."""
+    database._pool.close()
+    monkeypatch.setattr(database, 'DATABASE_NAME', str(tmp_path / 'pricepulse.db'))
+    database.init_db()
+    yield database
+    database.flush_price_history()
+    database._pool.close()
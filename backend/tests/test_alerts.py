@@ -0,0 +1,72 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alerts import evaluate_alerts
+
+URL = 'https://www.amazon.in/dp/B000000001'
+T = 1_700_000_000
+
+
+def evaluate(db, prices, currency='INR'):
+    """Runs the product's enabled rules over (price_minor, timestamp) points. Returns the alerts fired."""
+    with db.db_connection() as conn:
+        product_id = conn.execute("SELECT id FROM tracked_products WHERE url = ?", (URL,)).fetchone()['id']
+        rules = [dict(row) for row in conn.execute("SELECT * FROM alert_rules WHERE enabled = 1")]
+        points = [(product_id, price, currency, timestamp) for price, timestamp in prices]
+        events = evaluate_alerts(conn, rules, {product_id: points}, {product_id: URL})
+        conn.commit()
+    return events
+
+
+def tracked(db):
+    db.add_or_update_tracked_product(URL, 'Earbuds', None)
+
+
+def test_target_price_fires_once_until_the_condition_clears(db):
+    tracked(db)
+    db.create_alert_rule(URL, 'target_price', 'INR', T, target_minor=100000)
+
+    fired = evaluate(db, [(120000, T + 1), (99000, T + 2), (95000, T + 3)])
+    assert [(event['price_minor'], event['timestamp']) for event in fired] == [(99000, T + 2)]
+    assert evaluate(db, [(98000, T + 4)]) == [] # still below, already fired
+
+    fired = evaluate(db, [(110000, T + 5), (100000, T + 6)]) # re-armed, then at the target
+    assert [event['price_minor'] for event in fired] == [100000]
+    assert fired[0]['url'] == URL and fired[0]['threshold_minor'] == 100000
+
+
+def test_percent_drop_is_measured_from_the_highest_price_seen(db):
+    tracked(db)
+    db.create_alert_rule(URL, 'percent_drop', 'INR', T, percent=10)
+
+    fired = evaluate(db, [(100000, T + 1), (200000, T + 2), (185000, T + 3), (180000, T + 4)])
+
+    assert [(event['price_minor'], event['threshold_minor']) for event in fired] == [(180000, 180000)]
+    rule = db.get_alert_rules(product_url=URL)[0]
+    assert (rule['min_price'], rule['max_price'], rule['last_price']) == ('1000.00', '2000.00', '1800.00')
+
+
+def test_ignores_points_in_another_currency_and_older_than_the_state(db):
+    tracked(db)
+    db.create_alert_rule(URL, 'target_price', 'INR', T, target_minor=100000)
+    evaluate(db, [(120000, T + 10)])
+
+    assert evaluate(db, [(50000, T + 11)], currency='USD') == []
+    assert evaluate(db, [(50000, T + 5)]) == []
+
+
+def test_alerts_fire_from_written_price_points(db, monkeypatch):
+    delivered = []
+    monkeypatch.setattr(db, '_alert_listeners', [delivered.extend])
+    tracked(db)
+    db.create_alert_rule(URL, 'target_price', 'INR', T, target_minor=100000)
+
+    db.save_price_history(URL, 120000, T + 1, 'INR')
+    db.save_price_history(URL, 90000, T + 2, 'INR')
+    db.flush_price_history()
+
+    assert [event['price_minor'] for event in delivered] == [90000]
+    with db.db_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM alert_events").fetchone()[0] == 1
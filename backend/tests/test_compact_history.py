@@ -0,0 +1,44 @@
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compact_history import compact, merge_adjacent_intervals
+from migrations import migrate
+
+
+def make_db(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    migrate(conn)
+    conn.execute("INSERT INTO tracked_products (url, title) VALUES ('https://www.amazon.in/dp/B000000001', 't')")
+    return conn
+
+
+def test_merges_adjacent_intervals_with_the_same_price(tmp_path):
+    conn = make_db(tmp_path / 'merge.db')
+    conn.executemany('''
+        INSERT INTO price_history (product_id, price_minor, currency, first_seen, last_seen, samples)
+        VALUES (1, ?, 'INR', ?, ?, ?)
+    ''', [(500, 100, 200, 2), (500, 300, 400, 3), (700, 500, 600, 1), (500, 700, 800, 1)])
+
+    assert merge_adjacent_intervals(conn) == 1
+    rows = [tuple(row) for row in conn.execute(
+        "SELECT price_minor, first_seen, last_seen, samples FROM price_history ORDER BY first_seen")]
+    assert rows == [(500, 100, 400, 5), (700, 500, 600, 1), (500, 700, 800, 1)]
+
+
+def test_leaves_changed_prices_alone(tmp_path):
+    conn = make_db(tmp_path / 'changes.db')
+    conn.executemany('''
+        INSERT INTO price_history (product_id, price_minor, currency, first_seen, last_seen, samples)
+        VALUES (1, ?, 'INR', ?, ?, 1)
+    ''', [(500, 100, 100), (600, 200, 200)])
+
+    assert merge_adjacent_intervals(conn) == 0
+
+
+def test_compacts_a_database_that_does_not_exist_yet(tmp_path, capsys):
+    compact(str(tmp_path / 'new.db'))
+    assert "price_history rows: 0 -> 0" in capsys.readouterr().out
@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import MIGRATIONS, migrate, schema_version
+from pricing import to_epoch
+
+TRACKED = 'https://www.amazon.in/dp/B0DX798LW2'
+UNTRACKED = 'https://www.amazon.in/dp/B0CV7KZLL4'
+
+
+def make_v1_db(path):
+    """A database as the original app created it, before migrations existed (user_version 0)."""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript('''
+        CREATE TABLE tracked_products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT UNIQUE NOT NULL,
+            title TEXT,
+            image_url TEXT,
+            last_checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE price_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_url TEXT NOT NULL,
+            price TEXT,
+            timestamp TEXT NOT NULL,
+            FOREIGN KEY (product_url) REFERENCES tracked_products (url) ON DELETE CASCADE
+        );
+    ''')
+    conn.execute("INSERT INTO tracked_products (url, title) VALUES (?, 'Earbuds')", (TRACKED,))
+    conn.executemany("INSERT INTO price_history (product_url, price, timestamp) VALUES (?, ?, ?)", [
+        (TRACKED, '11,999', '2025-05-23 10:00:00'),
+        (TRACKED, '11,999.', '2025-05-23 11:00:00'),
+        (TRACKED, 'Price not found', '2025-05-23 11:30:00'),
+        (TRACKED, '7,850.', '2025-05-23 12:00:00'),
+        (TRACKED, '7,850.', 'not a timestamp'),
+        (UNTRACKED, '999.', '2025-05-23 10:30:00'),
+    ])
+    conn.commit()
+    return conn
+
+
+def test_migrates_a_v1_database_to_the_latest_schema(tmp_path):
+    conn = make_v1_db(tmp_path / 'v1.db')
+
+    assert migrate(conn) == len(MIGRATIONS)
+    assert schema_version(conn) == len(MIGRATIONS)
+
+    products = {row['url']: row for row in conn.execute("SELECT * FROM tracked_products")}
+    assert products[TRACKED]['product_key'] == 'amazon.in:B0DX798LW2'
+    assert UNTRACKED in products # history outliving its product keeps the product
+
+    # Unparseable prices and timestamps are dropped; equal consecutive prices become one interval
+    history = [tuple(row) for row in conn.execute('''
+        SELECT tp.url, ph.price_minor, ph.currency, ph.first_seen, ph.last_seen, ph.samples
+        FROM price_history ph JOIN tracked_products tp ON tp.id = ph.product_id
+        ORDER BY tp.url, ph.first_seen
+    ''')]
+    assert history == [
+        (UNTRACKED, 99900, 'INR', to_epoch('2025-05-23 10:30:00'), to_epoch('2025-05-23 10:30:00'), 1),
+        (TRACKED, 1199900, 'INR', to_epoch('2025-05-23 10:00:00'), to_epoch('2025-05-23 11:00:00'), 2),
+        (TRACKED, 785000, 'INR', to_epoch('2025-05-23 12:00:00'), to_epoch('2025-05-23 12:00:00'), 1),
+    ]
+    tables = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert not {'price_history_v1', 'price_history_v2'} & tables
+    assert {'price_rollup_hourly', 'price_rollup_daily', 'scrape_jobs', 'alert_rules'} <= tables
+
+    # Rollups are backfilled from the first and last point of each interval
+    daily = conn.execute('''
+        SELECT open_minor, high_minor, low_minor, close_minor, samples FROM price_rollup_daily
+        WHERE product_id = ?
+    ''', (products[TRACKED]['id'],)).fetchall()
+    assert [tuple(row) for row in daily] == [(1199900, 1199900, 785000, 785000, 3)]
+
+
+def test_migrating_twice_is_a_no_op(tmp_path):
+    conn = make_v1_db(tmp_path / 'v1.db')
+    migrate(conn)
+    assert migrate(conn) == 0
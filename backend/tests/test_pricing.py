@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pricing import format_price, parse_price
+
+
+@pytest.mark.parametrize('text, currency, expected', [
+    # Forms stored by the original scrapers (whole-price span, with or without its trailing dot)
+    ('11,999', 'INR', 1199900),
+    ('11,999.', 'INR', 1199900),
+    ('7,850.', 'INR', 785000),
+    ('999', 'INR', 99900),
+    ('1,23,456', 'INR', 12345600),
+    ('₹1,299.00', 'INR', 129900),
+    ('$19.99', 'USD', 1999),
+    ('1.299,00 €', 'EUR', 129900),
+    ('1 299,5 €', 'EUR', 129950),
+    ('¥1,299', 'JPY', 1299),
+    ('¥12,345', 'JPY', 12345),
+])
+def test_parses_prices_to_minor_units(text, currency, expected):
+    assert parse_price(text, currency) == expected
+
+
+@pytest.mark.parametrize('text', [None, '', 'Price not found', 'Currently unavailable.'])
+def test_returns_none_without_a_number(text):
+    assert parse_price(text, 'INR') is None
+
+
+def test_formats_minor_units_back():
+    assert format_price(1199900, 'INR') == '11999.00'
+    assert format_price(1299, 'JPY') == '1299'
@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrape_scheduler import AdaptiveScheduler
+from worker import ScrapeWorker
+
+URLS = [f'https://www.amazon.in/dp/B00000000{i}' for i in range(3)]
+NOW = 1_700_000_000
+
+
+def add_jobs(db, due_at=NOW):
+    db.add_tracked_products([(url, None) for url in URLS])
+    db.add_scrape_jobs([{'url': url, 'due_at': due_at, 'interval': 600, 'last_price': None} for url in URLS])
+
+
+def test_claims_each_due_job_once(db):
+    add_jobs(db)
+
+    first = db.claim_scrape_jobs('a', 2, 60, NOW)
+    second = db.claim_scrape_jobs('b', 10, 60, NOW)
+
+    assert len(first) == 2 and len(second) == 1
+    assert {job['url'] for job in first + second} == set(URLS)
+    assert db.claim_scrape_jobs('c', 10, 60, NOW) == []
+
+
+def test_does_not_claim_jobs_that_are_not_due(db):
+    add_jobs(db, due_at=NOW + 1)
+    assert db.claim_scrape_jobs('a', 10, 60, NOW) == []
+
+
+def test_expired_leases_are_claimable_again(db):
+    add_jobs(db)
+    db.claim_scrape_jobs('a', 10, 60, NOW)
+
+    assert db.claim_scrape_jobs('b', 10, 60, NOW + 59) == []
+    assert len(db.claim_scrape_jobs('b', 10, 60, NOW + 60)) == 3
+
+
+def test_completing_stores_the_schedule_and_releases_the_lease(db):
+    add_jobs(db)
+    jobs = db.claim_scrape_jobs('a', 10, 60, NOW)
+
+    done = [dict(job, due_at=NOW + 1200, interval=1200, last_price=99900, failures=0) for job in jobs]
+    assert db.complete_scrape_jobs('a', done) == 3
+
+    assert db.claim_scrape_jobs('b', 10, 60, NOW + 1199) == []
+    reclaimed = db.claim_scrape_jobs('b', 10, 60, NOW + 1200)
+    assert {(job['interval'], job['last_price']) for job in reclaimed} == {(1200, 99900)}
+
+
+def test_a_worker_whose_lease_was_taken_over_does_not_overwrite_the_job(db):
+    add_jobs(db)
+    stale = db.claim_scrape_jobs('a', 10, 60, NOW)
+    db.claim_scrape_jobs('b', 10, 60, NOW + 60)
+
+    assert db.complete_scrape_jobs('a', [dict(job, due_at=NOW, failures=0) for job in stale]) == 0
+
+
+class FailingEngine:
+    """Scrape engine stand-in whose every fetch fails."""
+
+    def fetch_all(self, urls, fetch):
+        for url in urls:
+            yield url, None
+
+
+def test_worker_backs_off_failed_jobs(db):
+    now = int(time.time()) # outcomes are rescheduled from the current time
+    add_jobs(db, due_at=now)
+    scheduler = AdaptiveScheduler(min_interval=300, max_interval=3600)
+    worker = ScrapeWorker(FailingEngine(), scheduler, owner='w', tick_seconds=60)
+    worker._next_job_sync = now + 60 # products already have jobs
+
+    summary = worker.run_once(now=now)
+
+    assert summary['outcomes'] == {'failed': 3}
+    assert db.claim_scrape_jobs('other', 10, 60, now + 290) == []
+    retried = db.claim_scrape_jobs('other', 10, 60, now + 400)
+    assert [job['failures'] for job in retried] == [1, 1, 1]
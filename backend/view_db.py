@@ -1,6 +1,7 @@
 import sqlite3
 
-DATABASE_NAME = 'pricepulse.db'
+from database import DATABASE_NAME # honours PRICEPULSE_DB
+from pricing import format_price, format_timestamp
 
 def view_data():
     conn = sqlite3.connect(DATABASE_NAME)
@@ -19,28 +20,32 @@ def view_data():
     if not rows:
         print("No products being tracked.")
     for row in rows:
-        print(f"ID: {row['id']}, URL: {row['url'][:50]}..., Title: {row['title'][:30]}..., Img: {row['image_url'] is not None}, LastChecked: {row['last_checked_at']}")
+        print(f"ID: {row['id']}, URL: {row['url'][:50]}..., Title: {(row['title'] or '')[:30]}..., Img: {row['image_url'] is not None}, LastChecked: {row['last_checked_at']}")
 
-    print("\n--- Price History (latest 5 per product) ---")
-    cursor.execute("SELECT DISTINCT product_url FROM price_history")
-    product_urls = [row['product_url'] for row in cursor.fetchall()]
+    print("\n--- Price History (latest 5 price changes per product) ---")
+    cursor.execute("""
+        SELECT DISTINCT tp.id, tp.url FROM tracked_products tp
+        JOIN price_history ph ON ph.product_id = tp.id
+    """)
+    products = cursor.fetchall()
 
-    if not product_urls:
+    if not products:
         print("No price history available.")
 
-    for p_url in product_urls:
-        print(f"\nHistory for: {p_url[:60]}...")
+    for product in products:
+        print(f"\nHistory for: {product['url'][:60]}...")
         cursor.execute("""
-            SELECT timestamp, price FROM price_history
-            WHERE product_url = ?
-            ORDER BY timestamp DESC
+            SELECT first_seen, last_seen, samples, price_minor, currency FROM price_history
+            WHERE product_id = ?
+            ORDER BY first_seen DESC
             LIMIT 5
-        """, (p_url,))
+        """, (product['id'],))
         history_rows = cursor.fetchall()
         if not history_rows:
             print("  No history entries for this product yet.")
         for h_row in history_rows:
-            print(f"  Timestamp: {h_row['timestamp']}, Price: {h_row['price']}")
+            print(f"  From: {format_timestamp(h_row['first_seen'])}, To: {format_timestamp(h_row['last_seen'])}, "
+                  f"Price: {format_price(h_row['price_minor'], h_row['currency'])} {h_row['currency'] or ''}, Scrapes: {h_row['samples']}")
 
     conn.close()
 
@@ -0,0 +1,174 @@
+"""
+Standalone scrape worker. Claims batches of due products from the scrape_jobs table,
+scrapes them and stores the results, so scraping runs in as many processes (on one
+machine or several sharing the database) as needed while the web app only serves requests:
+
+    SCRAPE_SCHEDULER_ENABLED=0 gunicorn -w 4 app:app
+    python worker.py    # one per core
+
+Claims are atomic, so no product is scraped by two workers at once. Each claimed job is
+leased for SCRAPE_LEASE_SECONDS; if a worker dies mid-batch, its jobs become claimable
+again when the lease expires. Rate limits (SCRAPE_MIN_DELAY, SCRAPE_PER_HOST_LIMIT) apply
+per worker process.
+"""
+import argparse
+import atexit
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+
+from alerts import build_notifier
+from database import (
+    init_db,
+    add_alert_listener,
+    add_scrape_jobs,
+    add_missing_scrape_jobs,
+    claim_scrape_jobs,
+    complete_scrape_jobs,
+    fill_missing_product_details,
+    get_product_schedule_stats
+)
+from fetch_cache import FetchCache
+from scrape_engine import ScrapeEngine
+from scrape_scheduler import AdaptiveScheduler, ProductSchedule
+from sweep import SCHEDULE_OUTCOMES, run_sweep
+import settings
+
+
+class ScrapeWorker:
+    """
+    Works the scrape_jobs queue: claims due jobs, scrapes them with run_sweep() and stores
+    each job's next due time as decided by `scheduler`'s interval policy. The scheduler
+    itself holds no products here; the job rows are the queue. Whenever nothing is due it
+    sleeps `tick_seconds`, which is also how often products tracked since get a job.
+    """
+
+    def __init__(self, engine, scheduler, fetch_cache=None, owner=None, batch_size=settings.SCRAPE_BATCH_SIZE,
+                 lease_seconds=settings.SCRAPE_LEASE_SECONDS, tick_seconds=settings.SCRAPE_TICK_SECONDS,
+                 slowest=settings.SWEEP_SLOWEST_URLS):
+        self.engine = engine
+        self.scheduler = scheduler
+        self.fetch_cache = fetch_cache or FetchCache()
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.tick_seconds = tick_seconds
+        self.slowest = slowest
+        self._next_job_sync = 0
+
+    def seed_jobs(self, now=None):
+        """Creates jobs for tracked products without one, with intervals seeded from their price history."""
+        now = now if now is not None else time.time()
+        jobs = []
+        for stats in get_product_schedule_stats():
+            interval = self.scheduler.interval_from_history(stats['change_count'], stats['history_span'])
+            last_checked = stats['last_checked_at']
+            jobs.append({
+                'url': stats['url'],
+                'due_at': int(last_checked + interval if last_checked else now),
+                'interval': round(interval),
+                'last_price': stats['last_price']
+            })
+        add_scrape_jobs(jobs)
+        self._next_job_sync = now + self.tick_seconds
+
+    def run_once(self, now=None):
+        """Claims and scrapes one batch of due jobs. Returns the sweep summary, or None if nothing was due."""
+        now = now if now is not None else time.time()
+        if now >= self._next_job_sync:
+            created = add_missing_scrape_jobs(round(self.scheduler.initial_interval), int(now))
+            if created:
+                logging.info(f"Created scrape jobs for {created} newly tracked products.")
+            self._next_job_sync = now + self.tick_seconds
+
+        jobs = claim_scrape_jobs(self.owner, self.batch_size, self.lease_seconds, int(now))
+        if not jobs:
+            return None
+
+        schedules = {}
+        for job in jobs:
+            schedule = ProductSchedule(job['url'], job['interval'], None, job['last_price'])
+            schedule.failures = job['failures']
+            schedules[job['url']] = (job['product_id'], schedule)
+
+        details = []
+
+        def record_outcome(url, outcome, product):
+            self.scheduler.reschedule(schedules[url][1], SCHEDULE_OUTCOMES[outcome],
+                                      product.price_minor if product else None)
+            if product:
+                details.append((product.title, product.image_url, url))
+
+        summary = run_sweep(list(schedules), self.engine, self.fetch_cache, record_outcome, self.slowest)
+        fill_missing_product_details(details) # e.g. bulk-tracked products, added without them
+        # A job without an outcome keeps its lease and is retried by whoever claims it after expiry
+        complete_scrape_jobs(self.owner, [{
+            'product_id': product_id,
+            'due_at': int(schedule.due_at),
+            'interval': round(schedule.interval),
+            'last_price': schedule.last_price,
+            'failures': schedule.failures
+        } for product_id, schedule in schedules.values() if schedule.due_at is not None])
+        return summary
+
+    def run_forever(self, stop_event):
+        """Works batches until `stop_event` is set, sleeping `tick_seconds` whenever nothing is due."""
+        logging.info(f"Scrape worker {self.owner} started.")
+        while not stop_event.is_set():
+            try:
+                summary = self.run_once()
+            except Exception as e:
+                logging.error(f"Scrape worker batch failed: {e}")
+                summary = None
+            if summary is None:
+                stop_event.wait(self.tick_seconds)
+        logging.info(f"Scrape worker {self.owner} stopped.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape due products from the shared job queue")
+    parser.add_argument('--batch-size', type=int, default=settings.SCRAPE_BATCH_SIZE, help="jobs claimed at a time")
+    parser.add_argument('--lease-seconds', type=int, default=settings.SCRAPE_LEASE_SECONDS,
+                        help="how long claimed jobs stay reserved for this worker")
+    parser.add_argument('--once', action='store_true', help="scrape one batch and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    init_db()
+    engine = ScrapeEngine(
+        max_workers=settings.SCRAPE_MAX_WORKERS,
+        per_host_limit=settings.SCRAPE_PER_HOST_LIMIT,
+        min_delay=settings.SCRAPE_MIN_DELAY,
+        jitter=settings.SCRAPE_JITTER
+    )
+    scheduler = AdaptiveScheduler(
+        min_interval=settings.SCRAPE_MIN_INTERVAL,
+        max_interval=settings.SCRAPE_MAX_INTERVAL
+    )
+    alert_notifier = build_notifier(
+        log=settings.ALERT_LOG_ENABLED,
+        jsonl_path=settings.ALERT_JSONL_PATH,
+        flush_interval=settings.ALERT_FLUSH_INTERVAL
+    )
+    add_alert_listener(alert_notifier.enqueue) # Alerts fire where price points are written, i.e. here
+    atexit.register(alert_notifier.close)
+    worker = ScrapeWorker(engine, scheduler, batch_size=args.batch_size, lease_seconds=args.lease_seconds)
+    worker.seed_jobs()
+
+    if args.once:
+        worker.run_once()
+    else:
+        # Finish the current batch on SIGTERM/Ctrl-C instead of leaving its jobs leased until expiry
+        stop_event = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+        signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+        worker.run_forever(stop_event)
+    engine.close()
+
+
+if __name__ == '__main__':
+    main()